@@ -2,8 +2,7 @@ import * as fs from "node:fs";
 import axios from "axios";
 import path from "node:path";
 
-async function saveAllBase64Images(responseData, slideNumber) {
-  const filename = `temp_video_gen/temp_assets/gemini-native-image_slide${slideNumber}.jpeg`;
+async function saveAllBase64Images(responseData, filename) {
   const arr = responseData["data"];
   for (let i = 0; i < arr.length; ++i) {
     const b64 = arr[i]["b64_json"];
@@ -19,7 +18,7 @@ async function saveAllBase64Images(responseData, slideNumber) {
   }
 }
 
-async function main(imagePrompt, imageRatio, slideNumber) {
+async function generateImage(imagePrompt, imageRatio, filename) {
   // You will need to set these environment variables or edit the following values.
   const endpoint = "https://hvbaj-mbutm191-westus3.cognitiveservices.azure.com/";
   const deployment = "gpt-image-1";
@@ -46,13 +45,35 @@ async function main(imagePrompt, imageRatio, slideNumber) {
     'Api-Key': subscriptionKey,
     'Content-Type': 'application/json'
   }});
-  await saveAllBase64Images(generationResponse.data, slideNumber);
+  await saveAllBase64Images(generationResponse.data, filename);
   console.log("Image generation completed successfully.");
 }
 
-// Check if this script is being run directly
-if (process.argv[2] === '--generate-image') {
-  const imagePrompt = `Generate a visually compelling, accurate, and educational image based on the input string provided in `+ process.argv[3] +`. This image will be used in professional course slides, so precision, clarity, and aesthetics are critical. Follow all the instructions below carefully and strictly.
+async function main(imagePrompt, imageRatio, slideNumber) {
+  await generateImage(imagePrompt, imageRatio, `temp_video_gen/temp_assets/gemini-native-image_slide${slideNumber}.jpeg`);
+}
+
+// Generate every job in a JSON file of [{prompt, ratio, output}] with at most `concurrency`
+// requests in flight, printing one JSON result line per job as it finishes.
+async function generateBatch(jobsPath, concurrency) {
+  const jobs = JSON.parse(fs.readFileSync(jobsPath, "utf8"));
+  let next = 0;
+  async function worker() {
+    while (next < jobs.length) {
+      const job = jobs[next++];
+      try {
+        await generateImage(buildImagePrompt(job.prompt), job.ratio, job.output);
+        console.log(JSON.stringify({ output: job.output, ok: true }));
+      } catch (err) {
+        console.log(JSON.stringify({ output: job.output, ok: false, error: String((err && err.message) || err) }));
+      }
+    }
+  }
+  await Promise.all(Array.from({ length: Math.max(1, Math.min(concurrency, jobs.length)) }, worker));
+}
+
+function buildImagePrompt(input) {
+  return `Generate a visually compelling, accurate, and educational image based on the input string provided in `+ input +`. This image will be used in professional course slides, so precision, clarity, and aesthetics are critical. Follow all the instructions below carefully and strictly.
 
 ---
 
@@ -60,7 +81,7 @@ if (process.argv[2] === '--generate-image') {
 
 1. Prompt Interpretation
 
-   * Analyze the content of `+ process.argv[3] +` in full.
+   * Analyze the content of `+ input +` in full.
    * Identify and visually represent its main themes, concepts, and objects.
    * Ensure the image translates the essence of the topic clearly and accurately.
 
@@ -72,7 +93,7 @@ if (process.argv[2] === '--generate-image') {
 3. Visual Clarity & Elegance
 
    * Maintain a clean, organized layout with clear spacing and visual hierarchy.
-   * Use icons, illustrations, or diagrams to reinforce the theme of `+ process.argv[3] +`.
+   * Use icons, illustrations, or diagrams to reinforce the theme of `+ input +`.
 
 4. Color Palette
 
@@ -81,7 +102,7 @@ if (process.argv[2] === '--generate-image') {
 
 5. Textual Content
 
-   * Include all relevant text, labels, headers, or short definitions derived from `+ process.argv[3] +`.
+   * Include all relevant text, labels, headers, or short definitions derived from `+ input +`.
    * Ensure text is:
 
      * Correctly spelled
@@ -93,7 +114,7 @@ if (process.argv[2] === '--generate-image') {
 
 ### Execution Steps (internal to model)
 
-1. Parse the full input string from `+ process.argv[3] +`.
+1. Parse the full input string from `+ input +`.
 2. Visually translate it into an educational illustration or diagram, maintaining thematic integrity.
 3. Choose either a dark blue or white background for optimal presentation.
 4. Apply a clean, consistent design suited for academic slide decks.
@@ -105,8 +126,19 @@ if (process.argv[2] === '--generate-image') {
 
 * A single, high-resolution image designed for immediate use in slides or course content.
 * Use of white or dark blue background only.
-* All relevant labeled text from `+ process.argv[3] +` must be included.
+* All relevant labeled text from `+ input +` must be included.
 * Visually aligned to clarity, instructional value, and modern design standards.`;
+}
+
+// Check if this script is being run directly
+if (process.argv[2] === '--generate-batch') {
+  const concurrency = parseInt(process.argv[4] || "4", 10);
+  generateBatch(process.argv[3], concurrency).catch((err) => {
+    console.error("Error in batch generation:", err);
+    process.exit(1);
+  });
+} else if (process.argv[2] === '--generate-image') {
+  const imagePrompt = buildImagePrompt(process.argv[3]);
 
   const imageRatio = process.argv[4];
   const slideNumber = process.argv[5];
@@ -0,0 +1,105 @@
+import os
+import logging
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from render_cache import DiskCache
+
+# Decoded assets are kept as raw RGBA files that every process memory-maps read-only,
+# so a PNG is decoded at most once per size no matter how many workers use it.
+ASSET_CACHE_DIR = os.getenv('ASSET_CACHE_DIR', os.path.join(tempfile.gettempdir(), "traihvail-assets"))
+ASSET_CACHE_MAX_BYTES = int(os.getenv('ASSET_CACHE_MAX_MB', "512")) * 1024 * 1024
+
+_cache = None
+# Both are keyed by the file's stamp too, so a long-lived process picks up a replaced image
+_arrays = {}  # (path, size, stamp) -> read-only RGBA array
+_wand_images = {}  # (path, stamp) -> WandImage
+_stats = {"decodes": 0, "raw_loads": 0, "hits": 0}
+
+
+def _asset_cache():
+    global _cache
+    if _cache is None:
+        _cache = DiskCache(ASSET_CACHE_DIR, ASSET_CACHE_MAX_BYTES, suffix=".rgba")
+    return _cache
+
+
+def file_stamp(path):
+    """(mtime_ns, size) of the file at path, which changes whenever the file is replaced."""
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def rgba_array(path, size=None):
+    """
+    The image at path as a read-only (height, width, 4) uint8 array, resized to size=(w, h)
+    if given. Repeated calls return the same array; other processes share the decoded pixels
+    through a memory-mapped raw file.
+    """
+    stamp = file_stamp(path)
+    key = (path, tuple(size) if size else None, stamp)
+    array = _arrays.get(key)
+    if array is not None:
+        _stats["hits"] += 1
+        return array
+
+    with Image.open(path) as image:
+        width, height = size or image.size
+    cache = _asset_cache()
+    cache_key = DiskCache.make_key(os.path.abspath(path), stamp[0], stamp[1], [width, height])
+    raw_path = cache.path_for(cache_key)
+    try:
+        array = np.memmap(raw_path, dtype=np.uint8, mode="r", shape=(height, width, 4))
+        os.utime(raw_path)  # Mark as recently used for LRU eviction
+        _stats["raw_loads"] += 1
+    except FileNotFoundError:
+        _stats["decodes"] += 1
+        with Image.open(path) as image:
+            image = image.convert("RGBA")
+            if image.size != (width, height):
+                image = image.resize((width, height), Image.LANCZOS)
+            pixels = image.tobytes()
+        # Written atomically so concurrent workers never map a partial file. The pixels used here
+        # stay in memory, so evicting the file later never pulls them from under this process.
+        cache.write(cache_key, pixels)
+        array = np.frombuffer(pixels, dtype=np.uint8).reshape(height, width, 4)
+        logging.info(f"Decoded asset {path} at {width}x{height}")
+
+    for stale in [other for other in _arrays if other[:2] == key[:2]]:
+        del _arrays[stale]  # An earlier version of the same file
+    _arrays[key] = array
+    return array
+
+
+def plate_array(path, size):
+    """An opaque background plate as an RGB array sized for clips of size=(w, h)."""
+    return rgba_array(path, size)[:, :, :3]
+
+
+def wand_image(path):
+    """
+    The image at path as a WandImage shared by every slide this process renders.
+    Treat it as read-only: composite it onto other images, never draw on it.
+    """
+    from wand.image import Image as WandImage
+
+    key = (path, file_stamp(path))
+    image = _wand_images.get(key)
+    if image is not None:
+        _stats["hits"] += 1
+        return image
+
+    array = rgba_array(path)
+    height, width = array.shape[:2]
+    image = WandImage(blob=array.tobytes(), format="rgba", width=width, height=height, depth=8)
+    for stale in [other for other in _wand_images if other[0] == path]:
+        _wand_images.pop(stale).close()
+    _wand_images[key] = image
+    return image
+
+
+def asset_stats():
+    """Per-process counters: PNG decodes, raw files mapped from other processes, and in-memory hits."""
+    return dict(_stats)
@@ -0,0 +1,91 @@
+import os
+import json
+import logging
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+BATCH_MEMORY_MB = int(os.getenv('BATCH_MEMORY_MB', "4096"))
+SLIDE_TASK_MB = 160  # Rough peak of one slide render: 1080p RGBA canvases, background, chart and snippet
+ENCODE_MB = 1024  # Reserved for the course being encoded alongside the slide renders
+
+
+def load_batch(manifest_path):
+    """
+    Read a batch manifest: a JSON list of jobs, each with input_json, output_video and
+    assets_dir and an optional id and export. Returns the jobs with every id filled in.
+    """
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        jobs = json.load(f)
+    if not isinstance(jobs, list) or not jobs:
+        raise ValueError(f"{manifest_path} must hold a non-empty JSON list of jobs")
+    for i, job in enumerate(jobs):
+        missing = [key for key in ("input_json", "output_video", "assets_dir") if not job.get(key)]
+        if missing:
+            raise ValueError(f"Job {i} in {manifest_path} is missing {', '.join(missing)}")
+        job.setdefault("id", os.path.splitext(os.path.basename(job["output_video"]))[0] + f"-{i}")
+    for key in ("id", "assets_dir"):
+        values = [job[key] for job in jobs]
+        duplicates = sorted({value for value in values if values.count(value) > 1})
+        if duplicates:
+            raise ValueError(f"Jobs in {manifest_path} share {key} {', '.join(map(str, duplicates))}")
+    return jobs
+
+
+def max_in_flight(memory_mb, workers):
+    """
+    How many slide renders may be on the pool at once within memory_mb, after reserving room
+    for an encode. A tight budget keeps some workers idle rather than overcommitting memory;
+    otherwise one render per worker is queued ahead so no worker waits on the scheduler.
+    """
+    budget = (memory_mb - ENCODE_MB) // SLIDE_TASK_MB
+    if budget < workers:
+        logging.warning(f"A {memory_mb} MB budget only fits {max(1, budget)} slide renders at once; {workers} workers requested")
+    return max(1, min(budget, 2 * workers))
+
+
+class FairScheduler:
+    """
+    Runs the tasks of many jobs on one shared executor. Tasks are taken from the jobs in turn,
+    so a long course cannot hold back the slides of the others, and at most max_in_flight are
+    submitted at any time so queued renders stay within the memory budget.
+    """
+
+    def __init__(self, executor, max_in_flight):
+        self._executor = executor
+        self._max_in_flight = max_in_flight
+
+    def run(self, tasks_by_job, fn, on_done):
+        """
+        Run fn(task) for every task of every job in tasks_by_job (job id -> list of tasks).
+        on_done(job_id, index, result, error) is called on this thread as each task finishes.
+        """
+        pending = deque((job_id, deque(enumerate(tasks))) for job_id, tasks in tasks_by_job.items() if tasks)
+        running = {}
+        while pending or running:
+            while pending and len(running) < self._max_in_flight:
+                job_id, tasks = pending.popleft()
+                index, task = tasks.popleft()
+                running[self._executor.submit(fn, task)] = (job_id, index)
+                if tasks:
+                    pending.append((job_id, tasks))
+            done, _not_done = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job_id, index = running.pop(future)
+                error = future.exception()
+                on_done(job_id, index, None if error else future.result(), error)
+
+
+def report(results, wall_time):
+    """Log per-course results and total throughput. Returns the batch summary as a dict."""
+    succeeded = [r for r in results if r["status"] == "ok"]
+    for r in results:
+        if r["status"] == "ok":
+            logging.info(f"Course {r['id']}: {r['slides']} slides, done {r['elapsed']:.1f}s into the batch -> {r['output_video']}")
+        else:
+            logging.error(f"Course {r['id']} failed: {r['error']}")
+    courses_per_hour = len(succeeded) * 3600 / wall_time if wall_time else 0
+    slides = sum(r["slides"] for r in succeeded)
+    logging.info(f"Batch: {len(succeeded)} of {len(results)} courses, {slides} slides in {wall_time:.1f}s "
+                 f"({courses_per_hour:.1f} courses/hour, {slides / wall_time if wall_time else 0:.2f} slides/s)")
+    return {"courses": len(results), "succeeded": len(succeeded), "slides": slides,
+            "wall": round(wall_time, 2), "courses_per_hour": round(courses_per_hour, 2), "results": results}
@@ -0,0 +1,247 @@
+"""
+End-to-end benchmark of generate_video.main() on synthetic courses, fully offline.
+TTS uses the silence backend and slide images the stub generator, with fresh caches per run.
+Each course size runs in its own process so peak RSS is measured per size.
+
+Run from the project root:
+    python src/scripts/benchmarks/bench_pipeline.py [--sizes 10 50 200] [--output results.json] [--compare old.json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+from collections import defaultdict
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, SCRIPTS_DIR)
+
+SLIDE_TYPES = ["title_slide", "content_slide", "code_slide", "chart_slide", "quiz_slide"]
+TRANSITIONS = ["slide_left", "slide_up", "fade_in", "fade_out", "dissolve", "slide_right", "slide_down"]
+WORDS = ("graph node edge weight path search queue stack memory cache thread process latency "
+         "throughput vector matrix gradient model training dataset feature label accuracy").split()
+CODE = '''def shortest_paths(graph, source):
+    dist = {node: float("inf") for node in graph}
+    dist[source] = 0
+    queue = [(0, source)]
+    while queue:
+        d, node = heapq.heappop(queue)
+        for neighbour, weight in graph[node]:
+            if d + weight < dist[neighbour]:
+                dist[neighbour] = d + weight
+                heapq.heappush(queue, (dist[neighbour], neighbour))
+    return dist
+'''
+# Stages timed by wrapping generate_video functions; the per-slide ones only run in this process with --workers 1
+STAGES = ["tts", "images", "layout", "chart", "raster", "prepare_other", "compose", "encode"]
+
+
+def synthetic_course(slide_count, words_per_slide, seed=0):
+    """A deterministic course cycling through the main slide types, with generated images on some slides."""
+    rng = random.Random(seed)
+
+    def sentence(count):
+        return " ".join(rng.choice(WORDS) for _ in range(count)).capitalize() + "."
+
+    slides = []
+    for i in range(slide_count):
+        slide_type = SLIDE_TYPES[i % len(SLIDE_TYPES)]
+        slide = {
+            "slideNumber": i + 1,
+            "type": slide_type,
+            "title": sentence(4),
+            "voiceover": sentence(words_per_slide),
+            "transition": TRANSITIONS[i % len(TRANSITIONS)],
+        }
+        if slide_type == "title_slide":
+            slide["subtitle"] = sentence(6)
+            slide["content"] = sentence(8)
+        elif slide_type == "content_slide":
+            slide["content"] = " ".join(sentence(12) for _ in range(4))
+        elif slide_type == "code_slide":
+            slide["code"] = CODE
+            slide["lexer"] = "python"
+        elif slide_type == "chart_slide":
+            slide["chartType"] = rng.choice(["bar", "line", "pie"])
+            slide["data"] = [{"label": rng.choice(WORDS), "value": rng.randint(1, 100)} for _ in range(5)]
+        elif slide_type == "quiz_slide":
+            slide["question"] = sentence(10)[:-1] + "?"
+            slide["options"] = [sentence(3) for _ in range(4)]
+        if slide_type == "title_slide" or i % 4 == 1:
+            slide["imagePrompt"] = sentence(8)
+            slide["imageRatio"] = "1x1" if i % 2 else "16x9"
+        slides.append(slide)
+    return {"slides": slides}
+
+
+class StageTimer:
+    """Accumulates wall time spent inside wrapped functions, per stage."""
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+
+    def wrap(self, owner, name, stage):
+        original = getattr(owner, name)
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.totals[stage] += time.perf_counter() - started
+
+        setattr(owner, name, timed)
+
+
+def run_one(slide_count, export_mode, workers, words_per_slide):
+    """Render one synthetic course in this process and return its measurements."""
+    work_dir = tempfile.mkdtemp(prefix="traihvail-bench-")
+    for name in ("TTS_CACHE_DIR", "SEGMENT_CACHE_DIR", "CHART_CACHE_DIR", "IMAGE_CACHE_DIR", "ASSET_CACHE_DIR"):
+        os.environ[name] = os.path.join(work_dir, name.lower())
+
+    import_started = time.perf_counter()
+    import generate_video as gv
+    import_time = time.perf_counter() - import_started
+    gv.TTS_BACKEND = "silence"
+    gv.IMAGE_GENERATOR = "stub"
+
+    timer = StageTimer()
+    timer.wrap(gv, "generate_slides_audio", "tts")
+    timer.wrap(gv, "generate_slide_images", "images")
+    timer.wrap(gv, "prepare_slides", "prepare")
+    timer.wrap(gv, "generate_slide_image", "slide_image")
+    for name in ("wrap_text", "measure_text", "font_extents"):
+        timer.wrap(gv, name, "layout")
+    timer.wrap(gv, "generate_chart_image", "chart")
+    # generate_video imports these when it encodes, so patching the modules reaches its calls
+    import timeline
+    import segment_export
+    timer.wrap(segment_export, "export_segmented", "encode")
+    timer.wrap(timeline.TimelineClip, "write_videofile", "encode")
+
+    course_path = os.path.join(work_dir, "course.json")
+    with open(course_path, "w", encoding="utf-8") as f:
+        json.dump(synthetic_course(slide_count, words_per_slide), f)
+    output_path = os.path.join(work_dir, "course.mp4")
+    assets_dir = os.path.join(work_dir, "assets")
+    os.makedirs(assets_dir)
+
+    started = time.perf_counter()
+    gv.main(course_path, output_path, assets_dir, workers=workers, export_mode=export_mode)
+    wall_time = time.perf_counter() - started
+
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+    video_seconds = ffmpeg_parse_infos(output_path)["duration"]
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    t = timer.totals
+    stages = {
+        "tts": t["tts"],
+        "images": t["images"],
+        "layout": t["layout"],
+        "chart": t["chart"],
+        "raster": t["slide_image"] - t["layout"] - t["chart"],
+        "prepare_other": t["prepare"] - t["slide_image"],
+        "compose": wall_time - t["tts"] - t["images"] - t["prepare"] - t["encode"],
+        "encode": t["encode"],
+    }
+    if workers > 1:
+        for stage in ("layout", "chart", "raster", "prepare_other"):
+            stages[stage] = None  # Spent in worker processes; only the prepare total is known
+        stages["prepare"] = t["prepare"]
+
+    return {
+        "slides": slide_count,
+        "export_mode": export_mode,
+        "workers": workers,
+        "import_seconds": import_time,
+        "wall_seconds": wall_time,
+        "video_seconds": video_seconds,
+        "video_seconds_per_wall_second": video_seconds / wall_time if wall_time else None,
+        "stages_seconds": stages,
+        # ffmpeg children are forked from this process, so their own peak is not reported separately
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(runs, previous=None):
+    baseline = {(r["slides"], r["export_mode"], r["workers"]): r for r in (previous or {}).get("runs", [])}
+    header = f"{'slides':>6} {'wall s':>8} {'video s':>8} {'x rt':>6} {'rss MB':>7} " + " ".join(f"{s[:8]:>8}" for s in STAGES)
+    if baseline:
+        header += f" {'vs prev':>8}"
+    print(header)
+    for r in runs:
+        stages = " ".join(f"{r['stages_seconds'][s]:>8.2f}" if r["stages_seconds"][s] is not None else f"{'-':>8}" for s in STAGES)
+        line = (f"{r['slides']:>6} {r['wall_seconds']:>8.1f} {r['video_seconds']:>8.1f} "
+                f"{r['video_seconds_per_wall_second']:>6.2f} {r['peak_rss_mb']:>7.0f} {stages}")
+        old = baseline.get((r["slides"], r["export_mode"], r["workers"]))
+        if old:
+            line += f" {old['wall_seconds'] / r['wall_seconds']:>7.2f}x"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200], help="Course sizes in slides (default: %(default)s)")
+    parser.add_argument("--export", choices=["single", "segments"], default="single", help="Export mode passed to main() (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=1, help="Workers passed to main(); per-slide stages are only broken down with 1 (default: %(default)s)")
+    parser.add_argument("--words", type=int, default=40, help="Voiceover words per slide (default: %(default)s)")
+    parser.add_argument("--output", default="pipeline_benchmark.json", help="Where to write the JSON results (default: %(default)s)")
+    parser.add_argument("--compare", help="Earlier results JSON to print speedups against")
+    parser.add_argument("--run-one", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        # Child mode: keep stdout for the result, send the pipeline's output to stderr
+        stdout = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+        os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+        result = run_one(args.run_one, args.export, args.workers, args.words)
+        stdout.write(json.dumps(result))
+        stdout.close()
+        return
+
+    runs = []
+    for size in args.sizes:
+        print(f"Rendering {size} slides...", file=sys.stderr)
+        command = [sys.executable, os.path.abspath(__file__), "--run-one", str(size), "--export", args.export,
+                   "--workers", str(args.workers), "--words", str(args.words)]
+        child = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        if child.returncode != 0:
+            print(f"Run with {size} slides failed (exit {child.returncode}); rerun it with --run-one {size} to see the log", file=sys.stderr)
+            sys.exit(1)
+        runs.append(json.loads(child.stdout))
+
+    results = {
+        "benchmark": "pipeline",
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "runs": runs,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    previous = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+    print_table(runs, previous)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
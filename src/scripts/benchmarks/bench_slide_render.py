@@ -0,0 +1,135 @@
+"""
+Benchmark and pixel-diff check of the slide renderers behind generate_slide_image(): Wand
+(ImageMagick, PNG) against Pillow (reused RGBA buffer, raw RGBA hand-off), on synthetic slides.
+Times drawing each slide and loading it back as the video stage does, then compares the pixels.
+Also renders the slides with Pillow from a template without font paths, which must not fail.
+
+Run from the project root:
+    python src/scripts/benchmarks/bench_slide_render.py [--slides 20] [--max-mean-diff 2.0] [--max-changed 2.0]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from moviepy.video.VideoClip import ImageClip
+
+from bench_pipeline import synthetic_course
+from slide_template import compile_template
+
+RENDERERS = ["wand", "pillow"]
+CHANGED_THRESHOLD = 32  # A pixel counts as changed when a channel differs by more than this
+
+
+def render_all(gv, renderer, slides, output_dir):
+    """Render every slide with one renderer. Returns per-slide layouts and paths, and the timings."""
+    gv.SLIDE_RENDERER = renderer
+    template = gv.get_template()  # Compiles and preloads fonts for this renderer, outside the timing
+    slide_renderer = gv.get_slide_renderer()
+    gv.generate_slide_image(slides[0], template, os.path.join(output_dir, f"warmup{slide_renderer.suffix}"))
+
+    results = []
+    draw_time = 0
+    load_time = 0
+    for slide in slides:
+        path = os.path.join(output_dir, f"slide_{slide['slideNumber']}{slide_renderer.suffix}")
+        started = time.perf_counter()
+        layout = gv.generate_slide_image(slide, template, path)
+        draw_time += time.perf_counter() - started
+
+        started = time.perf_counter()
+        clip = ImageClip(slide_renderer.load_slide(path, layout.width, layout.height))
+        pixels = np.dstack([clip.img, np.rint(clip.mask.img * 255).astype("uint8")]) if clip.mask is not None else clip.img
+        load_time += time.perf_counter() - started
+        results.append((layout, pixels))
+    return results, draw_time, load_time
+
+
+def without_font_paths(conf):
+    """A copy of template JSON with every font_path dropped, so each text style uses the renderer's default font."""
+    if isinstance(conf, dict):
+        return {key: without_font_paths(value) for key, value in conf.items() if key != "font_path"}
+    if isinstance(conf, list):
+        return [without_font_paths(value) for value in conf]
+    return conf
+
+
+def render_default_fonts(gv, slides, output_dir):
+    """Render every slide with Pillow from a template that names no fonts. Returns the slides that failed."""
+    gv.SLIDE_RENDERER = "pillow"
+    with open(gv.TEMPLATE_FILE) as f:
+        template = compile_template(without_font_paths(json.load(f)), gv.TEMPLATE_FILE)
+    failed = []
+    for slide in slides:
+        try:
+            gv.generate_slide_image(slide, template, os.path.join(output_dir, f"slide_{slide['slideNumber']}.rgba"))
+        except Exception as e:
+            failed.append((slide, e))
+    return failed
+
+
+def pixel_diff(a, b):
+    """(mean absolute difference per channel, percent of pixels with a channel off by more than CHANGED_THRESHOLD)."""
+    if a.shape != b.shape:
+        return float("inf"), 100.0
+    delta = np.abs(a.astype(np.int16) - b.astype(np.int16))
+    return float(delta.mean()), float(100.0 * (delta.max(axis=2) > CHANGED_THRESHOLD).mean())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--slides", type=int, default=20, help="Synthetic slides rendered per renderer (default: %(default)s)")
+    parser.add_argument("--words", type=int, default=40, help="Voiceover words per slide (default: %(default)s)")
+    parser.add_argument("--max-mean-diff", type=float, default=2.0, help="Fail when a slide's mean channel difference exceeds this (default: %(default)s)")
+    parser.add_argument("--max-changed", type=float, default=2.0, help="Fail when more than this percent of a slide's pixels changed (default: %(default)s)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="traihvail-bench-")
+    os.environ.setdefault("CHART_CACHE_DIR", os.path.join(work_dir, "charts"))
+    os.environ.setdefault("ASSET_CACHE_DIR", os.path.join(work_dir, "assets"))
+    import generate_video as gv
+
+    slides = synthetic_course(args.slides, args.words)["slides"]
+    runs = {}
+    try:
+        for renderer in RENDERERS:
+            output_dir = os.path.join(work_dir, renderer)
+            os.makedirs(output_dir)
+            runs[renderer] = render_all(gv, renderer, slides, output_dir)
+        output_dir = os.path.join(work_dir, "default-fonts")
+        os.makedirs(output_dir)
+        default_font_failures = render_default_fonts(gv, slides, output_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{'renderer':10} {'draw ms/slide':>14} {'load ms/slide':>14} {'total ms/slide':>15}")
+    for renderer, (_results, draw_time, load_time) in runs.items():
+        print(f"{renderer:10} {1000 * draw_time / len(slides):>14.1f} {1000 * load_time / len(slides):>14.1f} "
+              f"{1000 * (draw_time + load_time) / len(slides):>15.1f}")
+
+    failed = 0
+    print(f"\n{'slide':>5} {'type':22} {'mean diff':>10} {'changed %':>10} {'same layout':>12}")
+    for slide, (wand_layout, wand_pixels), (pillow_layout, pillow_pixels) in zip(slides, runs["wand"][0], runs["pillow"][0]):
+        mean_diff, changed = pixel_diff(wand_pixels, pillow_pixels)
+        same_layout = [box.key for box in wand_layout.elements] == [box.key for box in pillow_layout.elements]
+        ok = mean_diff <= args.max_mean_diff and changed <= args.max_changed and same_layout
+        failed += not ok
+        print(f"{slide['slideNumber']:>5} {slide['type']:22} {mean_diff:>10.3f} {changed:>10.3f} {str(same_layout):>12}{'' if ok else '  FAIL'}")
+    if failed:
+        print(f"{failed} of {len(slides)} slides differ beyond --max-mean-diff {args.max_mean_diff} / --max-changed {args.max_changed}%")
+    for slide, error in default_font_failures:
+        print(f"Slide {slide['slideNumber']} ({slide['type']}) failed to render with Pillow and no font_path: {error!r}")
+    if failed or default_font_failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Micro-benchmark for text_layout.wrap_text() against the original wrap that measured every
+candidate line with a fresh WandImage. Also checks that both produce the same line breaks
+in every font and size template3.json uses, and exits 1 if any differ.
+
+Run from the project root:
+    python src/scripts/benchmarks/bench_text_layout.py [--repeat N]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from wand.image import Image as WandImage
+from wand.drawing import Drawing
+
+import text_layout
+
+CONTENT = (
+    "Dynamic programming solves problems by combining the solutions of overlapping subproblems. "
+    "Instead of recomputing the same answers again and again, we store each result the first time "
+    "it is computed and look it up afterwards, which turns many exponential recursions into "
+    "polynomial algorithms. Typical examples include the Fibonacci sequence, the knapsack problem, "
+    "longest common subsequence, edit distance and shortest paths in weighted graphs. "
+) * 3
+POINTS = [
+    "Identify the state: which parameters uniquely describe a subproblem and its answer",
+    "Write the recurrence that relates a state to strictly smaller states",
+    "Choose between top-down memoization and bottom-up tabulation based on the access pattern",
+    "Reconstruct the actual solution by walking back through the stored decisions",
+] * 4
+
+
+def legacy_wrap_text(draw, text, max_width, line_spacing):
+    """The original wrap_text(): one ImageMagick metrics query per candidate line."""
+    lines = []
+    current_line = ""
+    total_height = 0
+    for word in text.split():
+        test_line = f"{current_line} {word}".strip()
+        metrics = draw.get_font_metrics(WandImage(width=1, height=1), test_line)
+        if metrics.text_width <= max_width:
+            current_line = test_line
+        else:
+            lines.append(current_line)
+            current_line = word
+            total_height += line_spacing
+    if current_line:
+        lines.append(current_line)
+        total_height += line_spacing
+    return lines, total_height
+
+
+def wrap_slide(wrap, draw, max_width, line_spacing):
+    lines = wrap(draw, CONTENT, max_width, line_spacing)[0]
+    for point in POINTS:
+        lines += wrap(draw, f"- {point}", max_width, line_spacing)[0]
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=20, help="Slides wrapped per measurement (default: %(default)s)")
+    args = parser.parse_args()
+
+    with open("template3.json", "r", encoding="utf-8") as f:
+        template = json.load(f)
+
+    results = []
+    seen = set()
+    for slide_type, config in template.items():
+        for key, text_conf in config.items():
+            if not isinstance(text_conf, dict) or "font_path" not in text_conf:
+                continue
+            font_size = text_conf.get("font_size", 30)
+            line_spacing = text_conf.get("line_spacing", font_size + 5)
+            max_width = config.get("slide_size", [1920, 1080])[0] - 200
+            if (text_conf["font_path"], font_size, max_width) in seen:
+                continue
+            seen.add((text_conf["font_path"], font_size, max_width))
+
+            with Drawing() as draw:
+                draw.font = text_conf["font_path"]
+                draw.font_size = font_size
+
+                started = time.perf_counter()
+                for _ in range(args.repeat):
+                    expected = wrap_slide(legacy_wrap_text, draw, max_width, line_spacing)
+                legacy_time = time.perf_counter() - started
+
+                text_layout._widths.clear()
+                started = time.perf_counter()
+                actual = wrap_slide(text_layout.wrap_text, draw, max_width, line_spacing)
+                cold_time = time.perf_counter() - started
+
+                started = time.perf_counter()
+                for _ in range(args.repeat):
+                    actual = wrap_slide(text_layout.wrap_text, draw, max_width, line_spacing)
+                warm_time = time.perf_counter() - started
+
+            results.append({
+                "style": f"{slide_type}.{key}",
+                "font_size": font_size,
+                "lines": len(expected),
+                "identical": actual == expected,
+                "legacy_ms_per_slide": 1000 * legacy_time / args.repeat,
+                "cold_ms_per_slide": 1000 * cold_time,
+                "warm_ms_per_slide": 1000 * warm_time / args.repeat,
+            })
+
+    print(f"{'style':32} {'size':>4} {'lines':>5} {'same':>5} {'legacy ms':>10} {'cold ms':>8} {'warm ms':>8} {'cold x':>7} {'warm x':>7}")
+    for r in results:
+        cold_speedup = r["legacy_ms_per_slide"] / max(r["cold_ms_per_slide"], 1e-9)
+        warm_speedup = r["legacy_ms_per_slide"] / max(r["warm_ms_per_slide"], 1e-9)
+        print(f"{r['style']:32} {r['font_size']:>4} {r['lines']:>5} {str(r['identical']):>5} "
+              f"{r['legacy_ms_per_slide']:>10.2f} {r['cold_ms_per_slide']:>8.2f} {r['warm_ms_per_slide']:>8.2f} "
+              f"{cold_speedup:>6.1f}x {warm_speedup:>6.1f}x")
+    if not all(r["identical"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Micro-benchmark for the array-based transitions of TimelineClip against the moviepy compositing
+path (vectorized=False) for all seven transition types. Also checks that both render the same frames.
+
+Run from the project root:
+    python src/scripts/benchmarks/bench_transitions.py [--size 1920x1080] [--fps 24] [--alpha opaque]
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from moviepy.video.VideoClip import ImageClip
+
+from timeline import build_timeline, TimelineClip
+
+TRANSITIONS = ["slide_left", "slide_right", "slide_up", "slide_down", "fade_in", "fade_out", "dissolve"]
+BACKGROUND_IMAGE = "Unstop.png"
+SLIDE_SECONDS = 3.0
+TRANSITION_SECONDS = 1.0
+
+
+def still_slide(size, alpha, seed):
+    """A noisy slide image, so no transition can get away with copying flat colour."""
+    width, height = size
+    rng = np.random.default_rng(seed)
+    image = rng.integers(0, 256, (height, width, 3 if alpha == "none" else 4), dtype="uint8")
+    if alpha == "opaque":
+        image[:, :, 3] = 255  # A mask like a rendered slide PNG's: present but all ones
+    elif alpha == "partial":
+        image[:, :, 3] = np.linspace(64, 255, width, dtype="uint8")
+    return ImageClip(image).set_duration(SLIDE_SECONDS)
+
+
+def transition_times(timeline, fps):
+    """Frame times that fall in a transition or fade window, where the two paths differ."""
+    times = np.arange(0, timeline.duration, 1.0 / fps)
+    return [t for t in times if timeline.still_key(t) is None]
+
+
+def render(timeline, times):
+    frames = []
+    started = time.perf_counter()
+    for t in times:
+        frame = timeline.get_frame(t)
+        frames.append(frame if frame.dtype == "uint8" else frame.astype("uint8"))
+    return frames, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", default="1920x1080", help="Slide size as WIDTHxHEIGHT (default: %(default)s)")
+    parser.add_argument("--fps", type=int, default=24, help="Frames per second rendered (default: %(default)s)")
+    parser.add_argument("--alpha", choices=["none", "opaque", "partial"], default="opaque",
+                        help="Slide mask: none, all ones like rendered slides, or a gradient (default: %(default)s)")
+    args = parser.parse_args()
+    size = tuple(int(value) for value in args.size.split("x"))
+
+    results = []
+    for i, transition in enumerate(TRANSITIONS):
+        clips = [still_slide(size, args.alpha, 2 * i), still_slide(size, args.alpha, 2 * i + 1)]
+        segments = build_timeline([SLIDE_SECONDS] * 2, [transition, "none"], ["content_slide"] * 2, TRANSITION_SECONDS)
+        legacy = TimelineClip(segments, clips, BACKGROUND_IMAGE, with_audio=False, vectorized=False)
+        vectorized = TimelineClip(segments, clips, BACKGROUND_IMAGE, with_audio=False)
+        times = transition_times(vectorized, args.fps)
+
+        expected, legacy_time = render(legacy, times)
+        actual, vectorized_time = render(vectorized, times)
+        results.append({
+            "transition": transition,
+            "frames": len(times),
+            "identical": all(np.array_equal(a, b) for a, b in zip(actual, expected)),
+            "legacy_ms_per_frame": 1000 * legacy_time / len(times),
+            "vectorized_ms_per_frame": 1000 * vectorized_time / len(times),
+        })
+
+    print(f"{'transition':12} {'frames':>6} {'same':>5} {'legacy ms':>10} {'array ms':>9} {'speedup':>8}")
+    for r in results:
+        speedup = r["legacy_ms_per_frame"] / max(r["vectorized_ms_per_frame"], 1e-9)
+        print(f"{r['transition']:12} {r['frames']:>6} {str(r['identical']):>5} "
+              f"{r['legacy_ms_per_frame']:>10.2f} {r['vectorized_ms_per_frame']:>9.2f} {speedup:>7.1f}x")
+    if not all(r["identical"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import os
+import json
+import logging
+import tempfile
+
+# Bump when a change to the rendering code should invalidate every recorded slide
+MANIFEST_VERSION = 1
+
+
+class BuildManifest:
+    """
+    Per-slide record of what the last build produced, kept next to the slide artifacts.
+    Each entry maps a slide number to the content hash it was rendered from and the paths
+    of its artifacts. The file is rewritten after every recorded slide, so an interrupted
+    build resumes from the last slide that finished.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable build manifest {path}: {e}")
+            return
+        if data.get("version") == MANIFEST_VERSION:
+            self.entries = data.get("slides", {})
+        else:
+            logging.info(f"Build manifest {path} is from another version; rebuilding every slide.")
+
+    def get(self, slide_number):
+        return self.entries.get(str(slide_number))
+
+    def is_fresh(self, slide_number, field, value, paths=()):
+        """True when the slide's recorded field equals value and all the given artifact paths still exist."""
+        entry = self.get(slide_number)
+        if not entry or entry.get(field) != value:
+            return False
+        return all(path and os.path.exists(path) for path in paths)
+
+    def record(self, slide_number, **fields):
+        """Merge fields into the slide's entry and persist the manifest."""
+        self.entries.setdefault(str(slide_number), {}).update(fields)
+        self.save()
+
+    def prune(self, slide_numbers):
+        """Forget slides that are no longer part of the course."""
+        keep = {str(number) for number in slide_numbers}
+        for number in [number for number in self.entries if number not in keep]:
+            del self.entries[number]
+        self.save()
+
+    def save(self):
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "slides": self.entries}, f, indent=2)
+        os.replace(tmp_path, self.path)  # Atomic so an interrupted write never leaves a corrupt manifest
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import cProfile
+import logging
+import threading
+from contextlib import contextmanager
+
+_events_fd = None
+_context = {}  # Fields added to every event, e.g. the job id in --serve mode
+_totals = {}  # stage -> [count, seconds, bytes, cache hits]
+_lock = threading.Lock()
+
+
+def open_events(fd):
+    """Send JSON-lines events to the already open file descriptor fd (e.g. 3, set up by the caller)."""
+    global _events_fd
+    os.fstat(fd)  # Fail early with EBADF rather than on the first event
+    _events_fd = fd
+
+
+def events_enabled():
+    return _events_fd is not None
+
+
+def set_context(**fields):
+    """Replace the fields added to every following event."""
+    global _context
+    _context = {key: value for key, value in fields.items() if value is not None}
+
+
+def emit(event, **fields):
+    """
+    Write one event as a JSON line. Each line goes out in a single write(), so events from
+    threads and forked worker processes sharing the descriptor never interleave.
+    """
+    if _events_fd is None:
+        return
+    record = {"event": event, "ts": round(time.time(), 3), "pid": os.getpid()}
+    record.update(_context)
+    record.update((key, value) for key, value in fields.items() if value is not None)
+    try:
+        os.write(_events_fd, (json.dumps(record) + "\n").encode("utf-8"))
+    except OSError as e:
+        logging.warning(f"Disabling progress events after failing to write them: {e}")
+        close_events()
+
+
+def close_events():
+    global _events_fd
+    _events_fd = None
+
+
+@contextmanager
+def span(stage, slide=None, **fields):
+    """
+    Time the enclosed block as one stage and emit a "span" event when it ends.
+    Yields a dict the block can fill in with "bytes" produced and a "cache_hit" flag or count.
+    """
+    record = dict(fields)
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield record
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        cache_hit = record.get("cache_hit")
+        with _lock:
+            totals = _totals.setdefault(stage, [0, 0.0, 0, 0])
+            totals[0] += 1
+            totals[1] += duration
+            totals[2] += record.get("bytes") or 0
+            totals[3] += int(cache_hit or 0)
+        emit("span", stage=stage, slide=slide, duration=round(duration, 4), error=True if failed else None, **record)
+
+
+def take_totals():
+    """Return the per-stage totals gathered so far in this process and start over."""
+    global _totals
+    with _lock:
+        totals, _totals = _totals, {}
+    return totals
+
+
+def merge_totals(totals):
+    """Add totals taken in another process (e.g. a slide worker) to this one's."""
+    with _lock:
+        for stage, values in totals.items():
+            current = _totals.setdefault(stage, [0, 0.0, 0, 0])
+            for i, value in enumerate(values):
+                current[i] += value
+
+
+def summary(wall_time):
+    """Per-stage totals as a JSON-ready dict, logged and emitted as a "summary" event."""
+    with _lock:
+        stages = {stage: {"count": count, "seconds": round(seconds, 3), "bytes": size, "cache_hits": hits}
+                  for stage, (count, seconds, size, hits) in _totals.items()}
+    for stage, totals in sorted(stages.items(), key=lambda item: -item[1]["seconds"]):
+        logging.info(f"Stage {stage}: {totals['seconds']:.2f}s over {totals['count']} spans, "
+                     f"{totals['bytes'] / 1024 / 1024:.1f} MB, {totals['cache_hits']} cache hits")
+    emit("summary", wall=round(wall_time, 3), stages=stages)
+    return stages
+
+
+@contextmanager
+def profiled(path):
+    """Collect a cProfile of the enclosed block (this thread only) into path, if one is given."""
+    if not path:
+        yield
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
+        logging.info(f"Profile written to {path} (inspect with python -m pstats)")
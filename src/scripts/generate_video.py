@@ -1,67 +1,167 @@
 import os
 import json
 import sys
+import time
+import shutil
+import argparse
+from collections import namedtuple
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dotenv import load_dotenv
-from wand.image import Image as WandImage
-from wand.drawing import Drawing
-from wand.color import Color
-from moviepy.editor import ImageClip, AudioFileClip, concatenate_videoclips, CompositeVideoClip, vfx, ColorClip
-import azure.cognitiveservices.speech as speechsdk
-from pygments import highlight
-from pygments.lexers import PythonLexer, JavaLexer, MathematicaLexer, CppLexer, CSharpLexer, HtmlLexer, CssLexer, JavascriptLexer, JsonLexer, YamlLexer, BashLexer, PerlLexer, PhpLexer, RubyLexer, SqlLexer, SwiftLexer, ObjectiveCLexer, MatlabLexer
-from pygments.formatters import ImageFormatter
-import subprocess
-from moviepy.video.fx.fadein import fadein
-from moviepy.video.fx.fadeout import fadeout
-from google import genai
-from google.genai import types 
 import re
-import base64 
-import asyncio
-import matplotlib.pyplot as plt
+import numpy as np
 import logging 
+import proglog
+from render_cache import DiskCache, file_digest
+from tts import create_backend, synthesize_many, synthesize_course, write_wav, wav_duration, assemble_track
+from image_gen import create_generator, generate_images, StubImageGenerator
+# moviepy and the modules built on it (timeline, segment_export) are imported where a course is put
+# on a timeline, so the CLI parses its arguments without them; warm_up() loads them for --serve
+from stream_export import StreamedClips, export_stream, STREAM_SEGMENT_TYPES, RENDITIONS, DEFAULT_RENDITIONS
+from text_layout import measure_text, font_extents, wrap_text
+from slide_template import load_template, style_for, preload_fonts, TEXT_KEYS
+from slide_render import create_renderer, SLIDE_RENDERERS
+from assets import asset_stats, file_stamp, plate_array, rgba_array, wand_image
+from snippets import render_snippet, get_lexer, LEXERS, DEFAULT_LEXER
+from build_manifest import BuildManifest, MANIFEST_VERSION
+from render_server import serve_stdio, serve_socket, DEFAULT_MAX_QUEUED_JOBS
+from batch import load_batch, max_in_flight, FairScheduler, report, BATCH_MEMORY_MB
+from events import open_events, events_enabled, set_context, emit, span, take_totals, merge_totals, summary, profiled
 
 # --- Configuration & Setup ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 load_dotenv() # Load environment variables from .env file
 
 # --- Azure Speech Config ---
-try:
-    speech_key = 'BdTcoulyAq3osLOnFTyNVtb8UudaziGVF0gE5ZD9mKhBrUYxoGXaJQQJ99BEACGhslBXJ3w3AAAYACOGYZi5'
-    speech_region ='centralindia'
-    if not speech_key or not speech_region:
-        raise ValueError("SPEECH_KEY and SPEECH_REGION environment variables must be set.")
-    speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=speech_region)
-    # Configure voice - Use environment variables or defaults
-    speech_config.speech_synthesis_language = os.getenv('SPEECH_LANGUAGE', "en-IN")
-    speech_config.speech_synthesis_voice_name = os.getenv('SPEECH_VOICE', "de-DE-Florian:DragonHDLatestNeural")
-    logging.info(f"Azure Speech configured for region: {speech_region}, language: {speech_config.speech_synthesis_language}, voice: {speech_config.speech_synthesis_voice_name}")
-except Exception as e:
-    logging.error(f"Failed to configure Azure Speech SDK: {e}")
-    sys.exit(1) # Exit if speech config fails
+speech_key = 'BdTcoulyAq3osLOnFTyNVtb8UudaziGVF0gE5ZD9mKhBrUYxoGXaJQQJ99BEACGhslBXJ3w3AAAYACOGYZi5'
+speech_region ='centralindia'
 
 # --- Constants ---
 DEFAULT_TEMPLATE_PATH = "template3.json" # Default template file name
+TEMPLATE_FILE = os.path.join(os.path.dirname(__file__), '..', '..', DEFAULT_TEMPLATE_PATH) # Assume template in project root
 DEFAULT_BACKGROUND_IMAGE = "UnstopWatermark.png" # Default background image
-DEFAULT_CHART_COLORS = plt.cm.viridis # Default color map
-
-# --- Event Loop Handling ---
-def get_or_create_eventloop():
-    try:
-        return asyncio.get_event_loop()
-    except RuntimeError as ex:
-        if "There is no current event loop in thread" in str(ex):
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            logging.info("Created new asyncio event loop.")
-            return asyncio.get_event_loop()
-    return asyncio.get_event_loop() # Return existing loop if available
-
-# Ensure an event loop exists for the current thread (important for Azure SDK async calls)
-try:
-    loop = get_or_create_eventloop()
-except Exception as e:
-     logging.warning(f"Could not ensure event loop: {e}") # Log warning, might not be fatal
+DEFAULT_CHART_COLORS = "viridis" # Default color map
+TRANSITION_BACKGROUND_IMAGE = "Unstop.png" # Plate shown behind slide transitions
+TRANSITION_DURATION = 1.7
+MANIFEST_FILENAME = "build_manifest.json" # Kept in assets_dir with the slide artifacts it describes
+TTS_LANGUAGE = "en-IN"
+TTS_VOICE = "en-IN-ArjunNeural"
+TTS_OUTPUT_FORMAT = "Riff24Khz16BitMonoPcm"
+# The TTS cache lives outside assets_dir because main() clears that folder after every run
+TTS_CACHE_DIR = os.getenv('TTS_CACHE_DIR', os.path.join(os.path.expanduser("~"), ".cache", "traihvail", "tts"))
+TTS_CACHE_MAX_BYTES = int(os.getenv('TTS_CACHE_MAX_MB', "512")) * 1024 * 1024
+TTS_BACKEND = os.getenv('TTS_BACKEND', "azure") # "azure", or "silence"/"espeak" to run offline
+TTS_MAX_IN_FLIGHT = int(os.getenv('TTS_MAX_IN_FLIGHT', "8"))
+TTS_MODE = os.getenv('TTS_MODE', "slides") # "slides": one request per slide, or "course": whole-course requests cut at bookmarks
+SEGMENT_CACHE_DIR = os.getenv('SEGMENT_CACHE_DIR', os.path.join(os.path.expanduser("~"), ".cache", "traihvail", "segments"))
+SEGMENT_CACHE_MAX_BYTES = int(os.getenv('SEGMENT_CACHE_MAX_MB', "2048")) * 1024 * 1024
+IMAGE_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', os.path.join(os.path.expanduser("~"), ".cache", "traihvail", "images"))
+IMAGE_CACHE_MAX_BYTES = int(os.getenv('IMAGE_CACHE_MAX_MB', "1024")) * 1024 * 1024
+IMAGE_GENERATOR = os.getenv('IMAGE_GENERATOR', "node") # "node", or "stub" to run offline
+IMAGE_GEN_CONCURRENCY = int(os.getenv('IMAGE_GEN_CONCURRENCY', "4"))
+SLIDE_RENDERER = os.getenv('SLIDE_RENDERER', "wand") # "wand" (ImageMagick), or "pillow" to draw with Pillow and skip PNG
+CHART_CACHE_DIR = os.getenv('CHART_CACHE_DIR', os.path.join(os.path.expanduser("~"), ".cache", "traihvail", "charts"))
+CHART_CACHE_MAX_BYTES = int(os.getenv('CHART_CACHE_MAX_MB', "256")) * 1024 * 1024
+CHART_SIZE = (1200, 800) # Pixel size charts are composited at
+MAX_CACHED_CHARTS = 32 # Rendered charts kept in memory per process
+# ImageFormatter loads its fonts when constructed, so these are the sizes snippets have always
+# rendered at (the old per-length font_size tweaks after construction never took effect)
+FORMULA_FONT_SIZE = 34
+CODE_FONT_SIZE = 26
+# --draft previews: the same slides and timing, encoded small, at a low frame rate and quickly
+DRAFT_SCALE = float(os.getenv('DRAFT_SCALE', "0.5")) # Fraction of the slide resolution
+DRAFT_FPS = int(os.getenv('DRAFT_FPS', "5"))
+DRAFT_PRESET = "ultrafast" # x264 preset
+
+_tts_cache = None
+_tts_backend = None
+_image_cache = None
+_image_generator = None
+_chart_cache = None
+_chart_figure = None
+_chart_images = {}  # cache key -> RGBA array
+_background_digest = None  # (file_stamp, digest) of DEFAULT_BACKGROUND_IMAGE
+_template = None
+_template_stamp = None
+_slide_renderer = None
+
+def get_tts_cache():
+    """Return the process-wide TTS audio cache, creating it on first use."""
+    global _tts_cache
+    if _tts_cache is None:
+        _tts_cache = DiskCache(TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES, suffix=".wav")
+    return _tts_cache
+
+def get_tts_backend():
+    """Return the process-wide TTS backend so its synthesizers and connections are reused."""
+    global _tts_backend
+    if _tts_backend is None:
+        if TTS_BACKEND == "azure":
+            if not speech_key or not speech_region:
+                raise ValueError("SPEECH_KEY and SPEECH_REGION environment variables must be set.")
+            _tts_backend = create_backend("azure", speech_key=speech_key, speech_region=speech_region,
+                                          language=TTS_LANGUAGE, voice=TTS_VOICE,
+                                          output_format=TTS_OUTPUT_FORMAT, pool_size=TTS_MAX_IN_FLIGHT)
+        else:
+            _tts_backend = create_backend(TTS_BACKEND)
+    return _tts_backend
+
+def get_image_cache():
+    """Return the process-wide generated image cache, creating it on first use."""
+    global _image_cache
+    if _image_cache is None:
+        _image_cache = DiskCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES, suffix=".jpeg")
+    return _image_cache
+
+def get_image_generator():
+    """Return the process-wide slide image generator."""
+    global _image_generator
+    if _image_generator is None:
+        _image_generator = create_generator(IMAGE_GENERATOR)
+    return _image_generator
+
+def get_slide_renderer():
+    """Return the process-wide slide renderer, so its fonts and canvas are reused across slides."""
+    global _slide_renderer
+    if _slide_renderer is None or _slide_renderer.name != SLIDE_RENDERER:
+        _slide_renderer = create_renderer(SLIDE_RENDERER)
+    return _slide_renderer
+
+def get_template():
+    """
+    Return the compiled template, validated and with its fonts preloaded once per process.
+    It is compiled again only when the template file or slide renderer changes, e.g. under a
+    long-lived --serve worker.
+    """
+    global _template, _template_stamp
+    stat = os.stat(TEMPLATE_FILE)
+    stamp = (TEMPLATE_FILE, stat.st_mtime_ns, stat.st_size, SLIDE_RENDERER)
+    if _template is None or stamp != _template_stamp:
+        template = load_template(TEMPLATE_FILE)
+        fonts = preload_fonts(template, get_slide_renderer().metrics())
+        logging.info(f"Template compiled from {TEMPLATE_FILE}: {len(template.styles)} slide types, {fonts} fonts preloaded")
+        _template, _template_stamp = template, stamp
+    return _template
+
+# --- Slide Layout ---
+# Where generate_slide_image() put things, so later stages never have to re-derive it.
+LayoutBox = namedtuple("LayoutBox", ["key", "left", "top", "right", "bottom"])
+SlideLayout = namedtuple("SlideLayout", ["width", "height", "elements", "y_offset", "free_region"])
+
+def layout_to_json(layout):
+    """A SlideLayout as plain JSON data for the build manifest."""
+    return {
+        "width": layout.width,
+        "height": layout.height,
+        "elements": [list(box) for box in layout.elements],
+        "y_offset": layout.y_offset,
+        "free_region": list(layout.free_region),
+    }
+
+def layout_from_json(data):
+    """Rebuild a SlideLayout recorded by layout_to_json()."""
+    return SlideLayout(data["width"], data["height"], [LayoutBox(*box) for box in data["elements"]],
+                       data["y_offset"], LayoutBox(*data["free_region"]))
 
 # --- Helper Functions ---
 
@@ -75,82 +175,63 @@ def sanitize_text(text):
     sanitized = re.sub('<[^>]*>', '', sanitized)
     return sanitized
 
-def slide_transition(clip1, clip2, direction, duration):
-    w, h = clip1.size
-
-    # Load the background image
-    background = ImageClip("Unstop.png").set_duration(duration).resize((w, h))
-
-    if direction == "top":
-        clip1 = clip1.set_position(lambda t: ('center', -w * t / duration))
-        clip2 = clip2.set_position(lambda t: ('center', w - w * t / duration))
-    elif direction == "bottom":
-        clip1 = clip1.set_position(lambda t: ('center', w * t / duration))
-        clip2 = clip2.set_position(lambda t: ('center', -w + w * t / duration))
-    elif direction == "left":
-        clip1 = clip1.set_position(lambda t: (-h * t / duration, 'center'))
-        clip2 = clip2.set_position(lambda t: (h - h * t / duration, 'center'))
-    elif direction == "right":
-        clip1 = clip1.set_position(lambda t: (h * t / duration, 'center'))
-        clip2 = clip2.set_position(lambda t: (-h + h * t / duration, 'center'))
-
-    # Create the transition clip with the background image
-    transition = CompositeVideoClip([background, clip1, clip2.set_start(duration)]).set_duration(duration).without_audio()
-    
-    return concatenate_videoclips([clip1, transition, clip2.set_start(duration)])
-
-def dissolve_transition(clip1, clip2, duration):
-    clip1 = fadeout(clip1,duration)
-    clip2 = fadein(clip2,duration)
-    return concatenate_videoclips([clip1, clip2])
-
-def apply_transition(clip1, clip2, transition_type="slide_left", duration=2):
-    if transition_type == "slide_left":
-        return slide_transition(clip1, clip2, direction="left", duration=duration)
-    elif transition_type == "slide_right":
-        return slide_transition(clip1, clip2, direction="right", duration=duration)
-    elif transition_type == "slide_up":
-        return slide_transition(clip1, clip2, direction="top", duration=duration)
-    elif transition_type == "slide_down":
-        return slide_transition(clip1, clip2, direction="bottom", duration=duration)
-    elif transition_type == "fade_in":
-        clip2 = fadein(clip2, duration)
-        return concatenate_videoclips([clip1, clip2])
-    elif transition_type == "fade_out":
-        clip1 = fadeout(clip1, duration)
-        return concatenate_videoclips([clip1, clip2])
-    elif transition_type == "dissolve":
-        return dissolve_transition(clip1, clip2, duration)
-    return concatenate_videoclips([clip1, clip2])
-
-def wrap_text(draw, text, max_width, font_size, line_spacing):
-    """Wraps text dynamically and returns the wrapped lines along with the total height consumed."""
-    lines = []
-    words = text.split()
-    current_line = ""
-    total_height = 0
-
-    for word in words:
-        test_line = f"{current_line} {word}".strip()
-        metrics = draw.get_font_metrics(WandImage(width=1, height=1), test_line)
-        
-        if metrics.text_width <= max_width:
-            current_line = test_line
-        else:
-            lines.append(current_line)
-            current_line = word
-            total_height += line_spacing  # Increase height when new line is added
-
-    if current_line:
-        lines.append(current_line)
-        total_height += line_spacing
-
-    return lines, total_height
-
-def generate_chart_image(slide_data, chart_path, template):
-    """Generate a chart image with configurable styles."""
-    chart_config = template.get("chart_slide", {}).get("chart_style", {})
+def get_chart_cache():
+    """Return the process-wide rendered chart cache, creating it on first use."""
+    global _chart_cache
+    if _chart_cache is None:
+        _chart_cache = DiskCache(CHART_CACHE_DIR, CHART_CACHE_MAX_BYTES, suffix=".rgba")
+    return _chart_cache
+
+def _chart_canvas():
+    """The Agg figure every chart in this process is drawn on, cleared between charts."""
+    global _chart_figure
+    if _chart_figure is None:
+        # matplotlib is only loaded once a course actually has a chart
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        _chart_figure = Figure()
+        FigureCanvasAgg(_chart_figure)
+    _chart_figure.clf()
+    return _chart_figure
+
+def generate_chart_image(slide_data, template, size=CHART_SIZE):
+    """
+    Render a chart with configurable styles straight to size=(w, h) pixels.
+    Returns a read-only (h, w, 4) uint8 RGBA array. Charts are cached by their data and
+    chart_style, in memory and on disk, so identical charts are only drawn once.
+    """
+    chart_config = template.chart_style
+    chart_type = slide_data.get("chartType", "bar")
+    data = slide_data.get("data", [])
+    title = slide_data.get("title", "Chart")
 
+    import matplotlib
+
+    width, height = size
+    cache_key = DiskCache.make_key(chart_type, title, data, chart_config, [width, height], matplotlib.__version__)
+    with span("chart", slide_data.get("slideNumber")) as record:
+        record["bytes"] = width * height * 4
+        chart = _chart_images.get(cache_key)
+        if chart is not None:
+            record["cache_hit"] = True
+            return chart
+        cached = get_chart_cache().read(cache_key)
+        if cached is not None and len(cached) == width * height * 4:
+            chart = np.frombuffer(cached, dtype=np.uint8).reshape(height, width, 4)
+            _chart_images[cache_key] = chart
+            record["cache_hit"] = True
+            return chart
+
+        chart = _draw_chart(chart_type, data, title, chart_config, size)
+        if len(_chart_images) >= MAX_CACHED_CHARTS:
+            _chart_images.pop(next(iter(_chart_images)))
+        _chart_images[cache_key] = chart
+        get_chart_cache().write(cache_key, chart.tobytes())
+        record["cache_hit"] = False
+        return chart
+
+def _draw_chart(chart_type, data, title, chart_config, size):
+    """Draw one chart on the shared canvas and return its pixels as a read-only RGBA array."""
     # Read styling properties from JSON
     show_legend = chart_config.get("show_legend", True)
     show_data_points = chart_config.get("show_data_points", True)
@@ -166,13 +247,17 @@ def generate_chart_image(slide_data, chart_path, template):
     label_color = chart_config.get("label_color", "#000000")
     label_size = chart_config.get("label_size", 14)
 
-    chart_type = slide_data.get("chartType", "bar")
-    data = slide_data.get("data", [])
-    title = slide_data.get("title", "Chart")
     labels = [item["label"] for item in data]
     values = [item["value"] for item in data]
 
-    fig, ax = plt.subplots(figsize=figure_size)
+    width, height = size
+    # Keep the template's figure width in inches so text scales as before, and pick the dpi
+    # that lands exactly on the target pixel size
+    dpi = width / figure_size[0]
+    fig = _chart_canvas()
+    fig.set_dpi(dpi)
+    fig.set_size_inches(width / dpi, height / dpi)
+    ax = fig.add_subplot()
 
     # Apply background color
     ax.set_facecolor(background_color)
@@ -205,221 +290,313 @@ def generate_chart_image(slide_data, chart_path, template):
     if show_legend and chart_type != "pie":
         ax.legend(labels, loc='best', fontsize=label_size)
 
-    plt.savefig(chart_path, format="png", dpi=300, bbox_inches="tight")
-    plt.close()
+    fig.tight_layout()  # Trims the margins like bbox_inches="tight" without changing the pixel size
+    fig.canvas.draw()
+    chart = np.array(fig.canvas.buffer_rgba())
+    chart.setflags(write=False)
+    if chart.shape[:2] != (height, width):
+        raise ValueError(f"Chart rendered at {chart.shape[1]}x{chart.shape[0]}, expected {width}x{height}")
+    return chart
 
 def generate_slide_image(slide_data, template, output_path):
     """
-    Generate slide image using Wand instead of OpenCV.
+    Generate the slide image with the configured slide renderer (Wand by default).
     Reads the slide's data and applies configurations from template.
+    Returns a SlideLayout with the bounding box of every rendered element and the free
+    region left below them.
     """
     slide_type = slide_data.get("type", "content_slide")
-    config = template.get(slide_type, template.get("content_slide"))
+    style = style_for(template, slide_type)
     
-    slide_size = [1920, 1080]
-    width, height = slide_size
-    with WandImage(filename='UnstopWatermark.png') as background:
-        width, height = background.width, background.height
+    with get_slide_renderer().canvas(DEFAULT_BACKGROUND_IMAGE) as canvas:
+        width, height = canvas.width, canvas.height
+        draw = canvas.draw
         y_offset = 0
-        with WandImage(width=width, height=height, background=Color('transparent')) as img:
-            img.composite(background, left=0, top=0)
-            with Drawing() as draw:
-                for key in ["title", "subtitle", "content", "question", "options", "points", "explanation"]:
-                    if key in slide_data and key in config:
-                        text_conf = config[key]
-                        max_width = width - 200  # Allow margin
-                        fontsize = text_conf.get("font_size", int(text_conf.get("scale", 1.0) * 30))
-                        font = text_conf.get("font_path", None)
-                        text_color = text_conf.get("color", "#000000")
-                        line_spacing = text_conf.get("line_spacing", fontsize + 5)
-                        alignment = text_conf.get("alignment", "left")  # NEW! Alignment option
-                        
-                        if font:
-                            draw.font = font
-                        draw.fill_color = Color(text_color)
-                        draw.font_size = fontsize
-                        
-                        if key in ["options"]:
-                            if isinstance(slide_data[key], dict):
-                                text = "<break>".join(f"{num}: {sanitize_text(item)}" for num, item in slide_data[key].items())
-                            else:
-                                text = "<break>".join(f"{num}: {sanitize_text(item)}" for num, item in enumerate(slide_data[key], start=1))
-                        elif key in ["points"]:
-                            if isinstance(slide_data[key], dict):
-                                text = "<break>".join(f"- {sanitize_text(item)}" for key, item in slide_data[key].items())
-                            else:
-                                text = "<break>".join(f"- {sanitize_text(item)}" for item in slide_data[key])
-                        else:
-                            if isinstance(slide_data[key], str):
-                                text = sanitize_text(slide_data[key])
-                            else:
-                                text = "<break>".join(sanitize_text(item) for item in slide_data[key])
-
-                        if key == "title":
-                            fixed_pos = text_conf.get("position", [100, 100])  # Default if missing
-                            _unused, y_offset = fixed_pos  # Keep title's fixed Y position
-
-                            y_offset += 20  # Add some spacing before the next element
-
-                        if key in ["content", "title", "subtitle", "explanation"]:  # Wrap text for 'content', 'title', 'subtitle', 'points', and 'options'
-                            lines, consumed_height = wrap_text(draw, text, max_width, fontsize, line_spacing)
-                        elif key in ["points", "options"]:
-                            line = text.split("<break>")
-                            lines = []
-                            for l in line:
-                                wrapped_lines, consumed_height = wrap_text(draw, l, max_width, fontsize, line_spacing)
-                                lines.extend(wrapped_lines)
-                        else:
-                            lines = text.split("\n")
-
-                        # print(lines)
-                        
-                        for line in lines:
-                            if alignment == "center":
-                                line_metrics = draw.get_font_metrics(WandImage(width=1, height=1), line)
-                                x_pos = int((width - line_metrics.text_width) / 2)  # Center align each line
-                            else:
-                                x_pos = 100  # Left align by default
-                        
-                            draw.text(x_pos, y_offset, line)
-                            y_offset += line_spacing  # Move down to next line
-
-
-                        # Add spacing after each section
-                        y_offset += 20
-
-                if "formula" in slide_data and "formula" in config:
-                    formula_text = slide_data["formula"]
-                    formatter = ImageFormatter(style='monokai', image_pad=17, line_pad=10, font_size=34, image_width=1000, image_height=1000)
-                    if len(formula_text) < 100:
-                        formatter.font_size = 37
-                    if len(formula_text) > 200:
-                        formatter.font_size = 27
-                    formula_snippet_path = "formula.png"
-                    highlight(formula_text, MathematicaLexer(), formatter, outfile=formula_snippet_path)
-                    # Load the code snippet image
-                    with WandImage(filename=formula_snippet_path) as formula_snippet:
-                        formula_conf = config["formula"]
-                        slide_width = config["slide_size"][0]
-                        formula_width = formula_snippet.width
-                        formula_pos = [(slide_width - formula_width) // 2, y_offset]
-                        img.composite(formula_snippet, left=formula_pos[0], top=formula_pos[1])
-
-                elif "code" in slide_data and "code" in config:
-                    code_text = slide_data["code"]
-                    formatter = ImageFormatter(style='monokai', image_pad=17, line_pad=10, font_size=26, image_width=1000, image_height=1000)
-                    if len(code_text) < 100:
-                        formatter.font_size = 32
-                    if len(code_text) > 200:
-                        formatter.font_size = 22
-                    code_snippet_path = "code.png"
-                    lexer = slide_data.get("lexer", 'bash')  # Replace None with a default value if needed
-                    if lexer == "python":
-                        highlight(code_text, PythonLexer(), formatter, outfile=code_snippet_path)
-                    elif lexer == "java":
-                        highlight(code_text, JavaLexer(), formatter, outfile=code_snippet_path)
-                    elif lexer == "mathematics":
-                        highlight(code_text, MathematicaLexer(), formatter, outfile=code_snippet_path)
-                    elif lexer == "cpp":
-                        highlight(code_text, CppLexer(), formatter, outfile=code_snippet_path)
-                    elif lexer == "c":
-                        highlight(code_text, CSharpLexer(), formatter, outfile=code_snippet_path)
-                    elif lexer == "html":
-                        highlight(code_text, HtmlLexer(), formatter, outfile=code_snippet_path)
-                    elif lexer == "css":
-                        highlight(code_text, CssLexer(), formatter, outfile=code_snippet_path)
-                    elif lexer == "javascript":
-                        highlight(code_text, JavascriptLexer(), formatter, outfile=code_snippet_path)
-                    elif lexer == "json":
-                        highlight(code_text, JsonLexer(), formatter, outfile=code_snippet_path)
-                    elif lexer == "yaml":
-                        highlight(code_text, YamlLexer(), formatter, outfile=code_snippet_path)
-                    elif lexer == "bash":
-                        highlight(code_text, BashLexer(), formatter, outfile=code_snippet_path)
-                    elif lexer == "perl":
-                        highlight(code_text, PerlLexer(), formatter, outfile=code_snippet_path)
-                    elif lexer == "php":
-                        highlight(code_text, PhpLexer(), formatter, outfile=code_snippet_path)
-                    elif lexer == "ruby":
-                        highlight(code_text, RubyLexer(), formatter, outfile=code_snippet_path)
-                    elif lexer == "sql":
-                        highlight(code_text, SqlLexer(), formatter, outfile=code_snippet_path)
-
-                    # Load the code snippet image
-                    with WandImage(filename=code_snippet_path) as code_snippet:
-                        code_conf = config["code"]
-                        code_pos = code_conf.get("position", [100, 100])
-                        img.composite(code_snippet, left=code_pos[0], top=code_pos[1])
-
-                draw(img)
-
-                if slide_type == "chart_slide":
-                    chart_path = output_path.replace(".png", "_chart.png")
-                    generate_chart_image(slide_data, chart_path, template)
-                    with WandImage(filename=chart_path) as chart_img:
-                        chart_img.resize(1200, 800)  # Ensure chart fits properly
-                        chart_pos = config.get("chart", {}).get("position", [400, 200])
-                        img.composite(chart_img, left=chart_pos[0], top=chart_pos[1])
-
-
-            img.format = 'png'
-            img.save(filename=output_path)
-            # print(f"Slide image generated at {output_path}")
-
-def generate_audio(text, filename):
-    try:
-        clean_text = sanitize_text(text)
-
-        # Initialize the Azure client
-        # Set either the `SpeechSynthesisVoiceName` or `SpeechSynthesisLanguage`.
-        speech_config.speech_synthesis_language = "en-IN" 
-        speech_config.speech_synthesis_voice_name ="en-IN-ArjunNeural"
-        audio_config = speechsdk.audio.AudioOutputConfig(filename=filename)
-        speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=audio_config)
-        speech_synthesis_result = speech_synthesizer.speak_text_async(clean_text).get()
-        
-    except Exception as e:
-        print("Error generating audio with Azure TTS: %s", e)
-        raise
+        elements = []
+        max_width = width - 200  # Allow margin
+        for text_style in style.texts:
+            key = text_style.key
+            if key in slide_data:
+                line_spacing = text_style.line_spacing
+                alignment = text_style.alignment
+                canvas.set_text_style(text_style.font_path, text_style.font_size, text_style.color)
+                
+                if key in ["options"]:
+                    if isinstance(slide_data[key], dict):
+                        text = "<break>".join(f"{num}: {sanitize_text(item)}" for num, item in slide_data[key].items())
+                    else:
+                        text = "<break>".join(f"{num}: {sanitize_text(item)}" for num, item in enumerate(slide_data[key], start=1))
+                elif key in ["points"]:
+                    if isinstance(slide_data[key], dict):
+                        text = "<break>".join(f"- {sanitize_text(item)}" for key, item in slide_data[key].items())
+                    else:
+                        text = "<break>".join(f"- {sanitize_text(item)}" for item in slide_data[key])
+                else:
+                    if isinstance(slide_data[key], str):
+                        text = sanitize_text(slide_data[key])
+                    else:
+                        text = "<break>".join(sanitize_text(item) for item in slide_data[key])
+
+                if key == "title":
+                    y_offset = text_style.top  # The title's fixed Y position plus some spacing
+
+                if key in ["content", "title", "subtitle", "explanation"]:  # Wrap text for 'content', 'title', 'subtitle', 'points', and 'options'
+                    lines, consumed_height = wrap_text(draw, text, max_width, line_spacing)
+                elif key in ["points", "options"]:
+                    line = text.split("<break>")
+                    lines = []
+                    for l in line:
+                        wrapped_lines, consumed_height = wrap_text(draw, l, max_width, line_spacing)
+                        lines.extend(wrapped_lines)
+                else:
+                    lines = text.split("\n")
+
+                # print(lines)
+                
+                ascender, descender = font_extents(draw)
+                first_baseline = y_offset
+                left, right = width, 0
+                for line in lines:
+                    line_width = measure_text(draw, line)
+                    if alignment == "center":
+                        x_pos = int((width - line_width) / 2)  # Center align each line
+                    else:
+                        x_pos = 100  # Left align by default
+                
+                    canvas.text(x_pos, y_offset, line)
+                    left, right = min(left, x_pos), max(right, x_pos + line_width)
+                    y_offset += line_spacing  # Move down to next line
+
+                if lines:
+                    last_baseline = y_offset - line_spacing
+                    elements.append(LayoutBox(key, left, first_baseline - ascender, right, last_baseline + descender))
+
+
+                # Add spacing after each section
+                y_offset += 20
+
+        if "formula" in slide_data and style.has_formula:
+            formula_text = slide_data["formula"]
+            formula_png = render_snippet(formula_text, "mathematics", FORMULA_FONT_SIZE)
+            with canvas.load_png(formula_png) as formula_snippet:
+                slide_width = style.slide_width
+                formula_width = formula_snippet.width
+                formula_pos = [(slide_width - formula_width) // 2, y_offset]
+                canvas.composite(formula_snippet, formula_pos[0], formula_pos[1])
+                elements.append(LayoutBox("formula", formula_pos[0], formula_pos[1], formula_pos[0] + formula_width, formula_pos[1] + formula_snippet.height))
+
+        elif "code" in slide_data and style.code_position is not None:
+            code_text = slide_data["code"]
+            lexer = slide_data.get("lexer", 'bash')  # Replace None with a default value if needed
+            code_png = render_snippet(code_text, lexer, CODE_FONT_SIZE)
+            with canvas.load_png(code_png) as code_snippet:
+                code_pos = style.code_position
+                canvas.composite(code_snippet, code_pos[0], code_pos[1])
+                elements.append(LayoutBox("code", code_pos[0], code_pos[1], code_pos[0] + code_snippet.width, code_pos[1] + code_snippet.height))
+
+        canvas.flush_text()  # Text goes over the snippets, the chart over the text
+
+        if slide_type == "chart_slide":
+            chart = generate_chart_image(slide_data, template)
+            chart_height, chart_width = chart.shape[:2]
+            chart_pos = style.chart_position
+            canvas.composite_array(chart, chart_pos[0], chart_pos[1])
+            elements.append(LayoutBox("chart", chart_pos[0], chart_pos[1], chart_pos[0] + chart_width, chart_pos[1] + chart_height))
+
+        canvas.save(output_path)
+
+    free_top = max((box.bottom for box in elements), default=0)
+    return SlideLayout(width, height, elements, y_offset, LayoutBox("free", 0, free_top, width, height))
+
+def generate_slides_audio(slides, output_dir, manifest=None, draft=False):
+    """
+    Synthesize the voiceover for every slide concurrently.
+    Slides whose audio the manifest shows was already built from the same text and voice are skipped.
+    A draft never calls the TTS backend: voiceovers not in the TTS cache get silent placeholders.
+    Returns a cache-hit flag per slide, in slide order.
+    """
+    backend = get_tts_backend()
+    # Course mode reads each voiceover in context, so its audio is never mixed up with per-slide audio
+    identity = backend.cache_identity() + (("course",) if TTS_MODE == "course" else ())
+    cache_hits = [True] * len(slides)
+    jobs = []
+    pending = []
+    for i, slide_data in enumerate(slides):
+        slide_number = slide_data.get("slideNumber", 1)
+        voice_text = sanitize_text(slide_data.get("voiceover", slide_data.get("content", "")))
+        audio_path = audio_path_for(slide_data, output_dir)
+        audio_key = DiskCache.make_key(voice_text, *identity)
+        if manifest is not None and manifest.is_fresh(slide_number, "audio_key", audio_key, [audio_path]):
+            continue
+        jobs.append((voice_text, audio_path))
+        pending.append((i, slide_number, audio_key))
+
+    logging.info(f"Synthesizing {len(jobs)} voiceovers with the '{TTS_BACKEND}' backend in {TTS_MODE} mode ({TTS_MAX_IN_FLIGHT} in flight, {len(slides) - len(jobs)} up to date)...")
+    with span("tts", slides=len(jobs)) as record:
+        if draft:
+            hits = draft_audio(jobs, identity)
+        elif TTS_MODE == "course":
+            hits = synthesize_course_audio(jobs, backend, identity)
+        else:
+            hits = synthesize_many(jobs, backend, cache=get_tts_cache(), max_in_flight=TTS_MAX_IN_FLIGHT)
+        record["cache_hit"] = sum(hits)
+        record["bytes"] = sum(os.path.getsize(audio_path) for _text, audio_path in jobs)
+    for (i, slide_number, audio_key), hit in zip(pending, hits):
+        cache_hits[i] = hit
+        if manifest is not None:
+            # A draft placeholder is recorded as no audio, so the next full build synthesizes it
+            manifest.record(slide_number, audio_key=audio_key if hit or not draft else None)
+    return cache_hits
+
+def draft_audio(jobs, identity):
+    """
+    Voiceovers for a draft: (text, path) jobs found in the TTS cache are copied from it and the
+    rest get silence sized like the spoken text, so slide timing stays close to the real thing.
+    Placeholders are never cached. Returns a cache-hit flag per job.
+    """
+    cache = get_tts_cache()
+    placeholder = create_backend("silence")
+    hits = []
+    for text, audio_path in jobs:
+        hits.append(cache.get(DiskCache.make_key(text, *identity), audio_path))
+        if not hits[-1]:
+            placeholder.synthesize(text, audio_path)
+    if not all(hits):
+        logging.info(f"Draft: {len(hits) - sum(hits)} voiceovers are placeholders until the next full render")
+    return hits
+
+def synthesize_course_audio(jobs, backend, identity):
+    """
+    Synthesize (text, path) jobs with as few whole-course requests as possible and write each
+    slide's slice of the returned PCM to its path as WAV. Returns a cache-hit flag per job.
+    """
+    cache = get_tts_cache()
+    hits = []
+    missing = []
+    for text, audio_path in jobs:
+        key = DiskCache.make_key(text, *identity)
+        hits.append(cache.get(key, audio_path))
+        if not hits[-1]:
+            missing.append((text, audio_path, key))
+
+    params, pieces = synthesize_course([text for text, _audio_path, _key in missing], backend, max_in_flight=TTS_MAX_IN_FLIGHT)
+    for (_text, audio_path, key), frames in zip(missing, pieces):
+        write_wav(audio_path, params, frames)
+        cache.put(key, audio_path)
+    return hits
+
+def assemble_voiceover(segments, slides, assets_dir):
+    """
+    Course mode's voiceover track: every slide's PCM copied to where its body starts on the
+    timeline, written as one WAV for the encoder instead of mixing decoded audio clips.
+    """
+    path = os.path.join(assets_dir, "voiceover.wav")
+    placements = [(segment.start, audio_path_for(slides[segment.slide], assets_dir))
+                  for segment in segments if segment.kind == "slide"]
+    with span("voiceover") as record:
+        assemble_track(placements, segments[-1].end, path)
+        record["bytes"] = os.path.getsize(path)
+    return path
+
+def audio_path_for(slide_data, output_dir):
+    # Every TTS backend writes WAV (Azure in TTS_OUTPUT_FORMAT), so the name says so
+    return os.path.join(output_dir, f"audio_{slide_data.get('slideNumber', 1)}.wav")
+
+def generated_image_path_for(slide_data, output_dir):
+    return os.path.join(output_dir, f"gemini-native-image_slide{slide_data.get('slideNumber', 1)}.jpeg")
+
+def generate_slide_images(slides, output_dir, draft=False):
+    """
+    Produce the generated image of every slide with an imagePrompt and imageRatio in one batch.
+    Images are cached by prompt and ratio, so a changed prompt never reuses a stale image and an
+    unchanged one is never generated twice. A draft uses cached images and flat placeholders
+    for the rest instead of generating any.
+    """
+    requests = []
+    for slide_data in slides:
+        image_path = generated_image_path_for(slide_data, output_dir)
+        if os.path.exists(image_path):
+            os.remove(image_path)  # Only ever show the image generated for the current prompt
+        image_prompt = slide_data.get("imagePrompt")
+        image_ratio = slide_data.get("imageRatio")
+        if image_prompt and image_ratio:
+            requests.append((image_prompt, image_ratio, image_path))
+    if not requests:
+        return
+
+    cache = get_image_cache()
+    with span("images", slides=len(requests)) as record:
+        hits_before = cache.hits
+        ready = generate_images(requests, get_image_generator(), cache=cache, max_concurrency=IMAGE_GEN_CONCURRENCY,
+                                fallback=StubImageGenerator() if draft else None)
+        record["cache_hit"] = cache.hits - hits_before
+        record["bytes"] = sum(os.path.getsize(image_path) for image_path in ready)
+    logging.info(f"Generated images: {len(ready)} of {len(requests)} ready, image cache {cache.hits} hits / {cache.misses} misses ({IMAGE_CACHE_DIR})")
 
+# The slide JSON generate_slide_image() reads: its text elements, snippet and chart
+SLIDE_IMAGE_FIELDS = ("type",) + TEXT_KEYS + ("formula", "code", "lexer", "chartType", "data")
 
-def process_slide(slide_data, template, output_dir):
+def slide_content_hash(slide_data, template, generated_image_path):
+    """
+    Hash everything that decides a slide's image and layout: the SLIDE_IMAGE_FIELDS of its JSON,
+    its template section, the slide renderer, the slide background and the generated image.
+    Edits to anything else, such as the voiceover or transition, keep the slide image.
+    """
+    global _background_digest
+    stamp = file_stamp(DEFAULT_BACKGROUND_IMAGE)
+    if _background_digest is None or _background_digest[0] != stamp:
+        _background_digest = (stamp, file_digest(DEFAULT_BACKGROUND_IMAGE).hexdigest())
+    style = style_for(template, slide_data.get("type", "content_slide"))
+    image_digest = file_digest(generated_image_path).hexdigest() if generated_image_path else None
+    fields = {key: slide_data[key] for key in SLIDE_IMAGE_FIELDS if key in slide_data}
+    return DiskCache.make_key(MANIFEST_VERSION, fields, style.digest, SLIDE_RENDERER, _background_digest[1], image_digest)
+
+def prepare_slide(slide_data, template, output_dir, previous=None):
     """
-    Process an individual slide: create image, generate audio, and combine them into a video clip.
+    Render the base slide image an individual slide needs. Generated images and voiceover audio
+    are produced for all slides up front by generate_slide_images() and generate_slides_audio().
+    previous is the slide's build manifest entry; when its content hash still matches, the
+    slide image from the last build is reused instead of rendered again.
+    Returns a plain dict of paths so it can be handed back from a worker process.
     """
     slide_number = slide_data.get("slideNumber", 1)
     slide_type = slide_data.get("type", "content_slide")
 
-    image_path = os.path.join(output_dir, f"slide_{slide_number}.png")
-    audio_path = os.path.join(output_dir, f"audio_{slide_number}.mp3")
+    image_path = os.path.join(output_dir, f"slide_{slide_number}{get_slide_renderer().suffix}")
+    audio_path = audio_path_for(slide_data, output_dir)
 
-    generated_image_path = os.path.join(output_dir, f"gemini-native-image_slide{slide_number}.jpeg")
+    generated_image_path = generated_image_path_for(slide_data, output_dir)
 
-    # Check if imagePrompt and imageRatio are present for image generation
-    image_prompt = slide_data.get("imagePrompt")
-    image_ratio = slide_data.get("imageRatio")
+    # generate_slide_images() has already put the slide's generated image here, if it has one
+    previous = previous or {}
+    if not os.path.exists(generated_image_path):
+        generated_image_path = None
+    content_hash = slide_content_hash(slide_data, template, generated_image_path)
+    reused = previous.get("content_hash") == content_hash and "layout" in previous and os.path.exists(image_path)
 
-    if image_prompt and image_ratio:
-        # Donot generate image if the image is already present
-        if os.path.exists(generated_image_path):
-            logging.info(f"Image for slide {slide_number} already exists. Skipping generation.")
+    with span("slide_image", slide_number) as record:
+        if reused:
+            layout = layout_from_json(previous["layout"])
         else:
-            logging.info(f"Generating image for slide {slide_number} with prompt: '{image_prompt}' and ratio: {image_ratio}")
-            command = ["node", "--experimental-modules", "src/ai/flows/generate-image.js", "--generate-image", f"'{image_prompt}'", image_ratio, str(slide_number)]
-            #print(command)
-            try:
-                subprocess.run(command, check=True, capture_output=True, text=True)
-                #print(f"Successfully generated image for slide {slide_number}.")
-            except subprocess.CalledProcessError as e:
-                logging.error(f"Error generating image for slide {slide_number}: {e.stderr}")
-
-    # Generate the base slide image (text, code, charts etc.)
-    generate_slide_image(slide_data, template, image_path) # This still generates the base image
-    voice_text = slide_data.get("voiceover", slide_data.get("content", ""))
-    generate_audio(voice_text, audio_path)
-
-    audio_clip = AudioFileClip(audio_path)
-    clip_duration = audio_clip.duration
+            # Generate the base slide image (text, code, charts etc.)
+            layout = generate_slide_image(slide_data, template, image_path) # This still generates the base image
+        record["cache_hit"] = reused
+        record["bytes"] = os.path.getsize(image_path)
+
+    return {
+        "slide_number": slide_number,
+        "slide_type": slide_type,
+        "image_path": image_path,
+        "audio_path": audio_path,
+        "generated_image_path": generated_image_path,
+        "layout": layout,
+        "content_hash": content_hash,
+        "reused": reused,
+    }
+
+def slide_clip_duration(slide_type, audio_duration):
+    """How long a slide stays on screen for a voiceover of audio_duration seconds."""
+    clip_duration = audio_duration
 
     clip_duration += 2
 
@@ -428,95 +605,196 @@ def process_slide(slide_data, template, output_dir):
         clip_duration += 6  # Add 10 seconds for quiz slides
     elif slide_type == "code_slide":
         clip_duration += 5  # Add 8 seconds for code slides
+    return clip_duration
 
-    slide_clip = ImageClip(image_path).set_duration(clip_duration)
+def build_slide_clip(slide_data, template, prepared):
+    """
+    Combine the prepared slide image, audio and generated image into a video clip.
+    Nothing on a slide moves, so overlays are flattened into a single still image here once
+    rather than composited again for every frame.
+    """
+    with span("clip", prepared["slide_number"]):
+        return _build_slide_clip(prepared)
+
+def _build_slide_clip(prepared):
+    from moviepy.video.VideoClip import ImageClip
+    from moviepy.audio.io.AudioFileClip import AudioFileClip
+    from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+    from moviepy.video.fx.resize import resize
+    from timeline import flatten
+
+    slide_type = prepared["slide_type"]
+    image_path = prepared["image_path"]
+    audio_path = prepared["audio_path"]
+    generated_image_path = prepared["generated_image_path"]
+
+    if TTS_MODE == "course":
+        # The voiceover track is assembled from PCM separately, so the clip carries no audio
+        audio_clip = None
+        clip_duration = slide_clip_duration(slide_type, wav_duration(audio_path))
+    else:
+        audio_clip = AudioFileClip(audio_path)
+        clip_duration = slide_clip_duration(slide_type, audio_clip.duration)
+
+    layout = prepared["layout"]
+    slide_clip = ImageClip(get_slide_renderer().load_slide(image_path, layout.width, layout.height)).set_duration(clip_duration)
     video_clip = slide_clip.set_audio(audio_clip)
 
     # If a generative image was created, overlay it on the base slide
-    if os.path.exists(generated_image_path):  # Check if the generative image exists
+    if generated_image_path:  # Check if the generative image exists
         if slide_type == "title_slide":
             # Set the generated image as the background for title slides
-            gen_image_clip = ImageClip(generated_image_path).set_duration(clip_duration).resize(newsize=slide_clip.size)
+            gen_image_clip = resize(ImageClip(generated_image_path).set_duration(clip_duration), newsize=slide_clip.size)
             gen_image_clip = gen_image_clip.set_position(('center', 'center'))  # Center the image
             # Overlay the title slide textual content on top of the generated image
             slide_clip = slide_clip.set_position(('center', 'center'))  # Center the text
             slide_clip = slide_clip.set_opacity(0.9)  # Make the text slightly transparent
-            video_clip = CompositeVideoClip([gen_image_clip, slide_clip]).set_duration(clip_duration).set_audio(audio_clip)
+            video_clip = flatten(CompositeVideoClip([gen_image_clip, slide_clip]).set_duration(clip_duration).set_audio(audio_clip))
         else:
-            # Resize and position the generated image below all text content for other slide types
-            with WandImage(filename=generated_image_path) as gen_image:
-                # Get slide dimensions
-                slide_width, slide_height = slide_clip.size
-                
-                # We need to calculate the total height of the text content to place the image below it.
-                # This requires re-parsing the slide content and calculating heights similar to generate_slide_image
-                # For simplicity in this diff, we'll use a fixed offset after a calculated approximate text height.
-                # A more robust solution would re-use the text rendering logic to get the exact final Y position.
-                approx_text_height = 100
-
-                # Debugging: Print slide_data to verify the content key
-                #print("slide_data:", slide_data)
-
-                from PIL import Image
-
-                for key in ["title", "subtitle", "content", "question", "options", "points", "explanation"]:
-                    if key in slide_data and key in template[slide_type]:
-                        text_conf = template[slide_type][key]
-                        fontsize = text_conf.get("font_size", int(text_conf.get("scale", 1.0) * 30))
-                        line_spacing = text_conf.get("line_spacing", fontsize + 5)
-                        
-                        # Debugging: Print the key and its calculated height
-                        #print(f"Processing key: {key}, fontsize: {fontsize}, line_spacing: {line_spacing}")
-                        
-                        if isinstance(slide_data[key], list):
-                            # Join the list into a single string with newline separators
-                            text_content = "\n".join(slide_data[key])
-                        elif isinstance(slide_data[key], str):
-                            # Use the string as-is
-                            text_content = slide_data[key]
-                        else:
-                            # Handle unexpected types
-                            raise TypeError(f"Unexpected type for slide_data[{key}]: {type(slide_data[key])}")
-
-                        # Calculate the approximate text height
-                        for line in text_content.split("\n"):
-                            if line.endswith(".jpeg"):  # Check if the line contains an image reference
-                                try:
-                                    # Open the image and get its height
-                                    with Image.open(line) as img:
-                                        image_height = img.height
-                                        approx_text_height += image_height
-                                        #print(f"Adding image height for {line}: {image_height}")
-                                except FileNotFoundError:
-                                    #print(f"Image file not found: {line}")
-                                    raise
-                            else:
-                                # Add height for text
-                                approx_text_height += line_spacing + 20
-              
-                image_y_pos = approx_text_height + 60 # Position below approximate text content
-                gen_image_clip = ImageClip(generated_image_path).set_duration(clip_duration).resize(width=slide_clip.w * 0.6).set_position(('center', image_y_pos)) # Resize and center horizontally
-                video_clip = CompositeVideoClip([slide_clip, gen_image_clip]).set_duration(clip_duration).set_audio(audio_clip)
-                
-                # Calculate available vertical space for the image below the text
-                available_height = slide_height - image_y_pos
-                
+            # Resize and position the generated image in the free region generate_slide_image() left below the content
+            free_region = prepared["layout"].free_region
+            image_y_pos = int(free_region.top) + 60 # Gap below the slide content
+            available_height = free_region.bottom - image_y_pos
+
+            if available_height <= 0:
+                logging.warning(f"No room left below the content of slide {prepared['slide_number']}; skipping its generated image.")
+            else:
+                gen_image_clip = ImageClip(generated_image_path).set_duration(clip_duration)
                 # Resize the image to fit within the available space while maintaining aspect ratio
-                original_aspect_ratio = gen_image.width / gen_image.height
-                
-                if gen_image.height > available_height:
-                    new_height = available_height * 0.7
-                    new_width = int(new_height * original_aspect_ratio)
-                    gen_image_clip = ImageClip(generated_image_path).set_duration(clip_duration).resize(height=new_height)
-                
-                # Position the resized image below the text with a gap, centered horizontally
+                if gen_image_clip.h > available_height:
+                    gen_image_clip = resize(gen_image_clip, height=available_height * 0.7)
+                else:
+                    gen_image_clip = resize(gen_image_clip, width=slide_clip.w * 0.6)
+
+                # Position the resized image below the content with a gap, centered horizontally
                 gen_image_clip = gen_image_clip.set_position(('center', image_y_pos))
-                video_clip = CompositeVideoClip([slide_clip, gen_image_clip]).set_duration(clip_duration).set_audio(audio_clip)
+                video_clip = flatten(CompositeVideoClip([slide_clip, gen_image_clip]).set_duration(clip_duration).set_audio(audio_clip))
     return video_clip
 
+# Module settings the CLI can override; spawned workers re-import the module and would see the defaults
+WORKER_SETTINGS = ("TTS_BACKEND", "TTS_MAX_IN_FLIGHT", "TTS_MODE", "IMAGE_GENERATOR", "IMAGE_GEN_CONCURRENCY", "SLIDE_RENDERER")
+
+def worker_settings():
+    return {name: globals()[name] for name in WORKER_SETTINGS}
+
+def configure_worker(settings):
+    globals().update(settings)
+
+def worker_pool(workers):
+    """
+    Start a process pool for slide work. Shared backgrounds are decoded here first so forked
+    workers map the raw pixels, and each worker is handed the parent's settings so the CLI
+    flags hold under any start method.
+    """
+    rgba_array(DEFAULT_BACKGROUND_IMAGE)
+    return ProcessPoolExecutor(max_workers=workers, initializer=configure_worker, initargs=(worker_settings(),))
+
+def _prepare_slide_task(args):
+    """
+    Worker entry point: prepare one slide and report which process did it, for how long, and
+    the stage totals it gathered so the parent's summary includes them.
+    """
+    slide_data, template, output_dir, previous = args
+    started = time.time()
+    decodes_before = asset_stats()["decodes"]
+    take_totals()  # Drop totals inherited from the parent or left by an earlier slide
+    prepared = prepare_slide(slide_data, template, output_dir, previous)
+    return prepared, os.getpid(), time.time() - started, asset_stats()["decodes"] - decodes_before, take_totals()
+
+def _record_prepared(manifest, prepared):
+    if manifest is not None:
+        manifest.record(prepared["slide_number"], content_hash=prepared["content_hash"],
+                        image_path=prepared["image_path"], generated_image_path=prepared["generated_image_path"],
+                        audio_path=prepared["audio_path"], layout=layout_to_json(prepared["layout"]))
+
+def iter_prepare_slides(slides, template, output_dir, workers=1, manifest=None):
+    """
+    Prepare every slide, either in order on this process or fanned out over a process pool,
+    yielding each one in slide order as soon as it and every slide before it are done.
+    Each finished slide is recorded in manifest right away, so an interrupted run resumes there.
+    """
+    previous = [manifest.get(slide.get("slideNumber", 1)) if manifest is not None else None for slide in slides]
+    reused = 0
+
+    if workers <= 1:
+        for i, (slide, entry) in enumerate(zip(slides, previous)):
+            prepared = prepare_slide(slide, template, output_dir, entry)
+            _record_prepared(manifest, prepared)
+            reused += prepared["reused"]
+            emit("progress", stage="prepare", slide=prepared["slide_number"], done=i + 1, total=len(slides))
+            yield prepared
+        logging.info(f"Slide images: {len(slides) - reused} rendered, {reused} reused from the last build")
+        return
+
+    logging.info(f"Preparing {len(slides)} slides with {workers} worker processes...")
+    started = time.time()
+    busy = {}
+    with worker_pool(workers) as executor:
+        tasks = [(slide, template, output_dir, entry) for slide, entry in zip(slides, previous)]
+        for i, (prepared, pid, elapsed, decodes, totals) in enumerate(executor.map(_prepare_slide_task, tasks)):
+            slides_done, busy_time, worker_decodes = busy.get(pid, (0, 0.0, 0))
+            busy[pid] = (slides_done + 1, busy_time + elapsed, worker_decodes + decodes)
+            merge_totals(totals)
+            _record_prepared(manifest, prepared)
+            reused += prepared["reused"]
+            emit("progress", stage="prepare", slide=prepared["slide_number"], done=i + 1, total=len(slides))
+            yield prepared
+    wall_time = time.time() - started
+    logging.info(f"Slide images: {len(slides) - reused} rendered, {reused} reused from the last build")
+
+    for pid, (slides_done, busy_time, decodes) in sorted(busy.items()):
+        utilization = 100 * busy_time / wall_time if wall_time else 0
+        logging.info(f"Worker {pid}: {slides_done} slides, busy {busy_time:.1f}s of {wall_time:.1f}s ({utilization:.0f}% utilization), {decodes} asset decodes")
+
+def prepare_slides(slides, template, output_dir, workers=1, manifest=None):
+    """
+    Prepare every slide and return them in slide order, so the clip stage is identical
+    for the sequential and the process pool paths.
+    """
+    return list(iter_prepare_slides(slides, template, output_dir, workers=workers, manifest=manifest))
+
 # --- Main Execution ---
-def main(script_input_path, video_output_path, assets_dir):
-    """Main function to generate the video."""
+class EncodeProgress(proglog.ProgressBarLogger):
+    """moviepy logger that reports write_videofile()'s frame loop as "progress" events."""
+
+    def __init__(self, every=50):
+        super().__init__()
+        self.every = every
+
+    def bars_callback(self, bar, attr, value, old_value=None):
+        if bar == "t" and attr == "index" and (value + 1) % self.every == 0:
+            emit("progress", stage="encode", done=value + 1, total=self.bars[bar]["total"])
+
+def main(script_input_path, video_output_path, assets_dir, workers=1, export_mode="single", full_rebuild=False, profile_path=None,
+         renditions=DEFAULT_RENDITIONS, draft=False):
+    """
+    Main function to generate the video.
+    Every stage is timed: with an events fd open, spans and progress go out as JSON lines as
+    they happen, and a per-stage summary is logged and emitted at the end. profile_path, if
+    given, receives a cProfile dump of the run.
+    """
+    take_totals()
+    started = time.time()
+    emit("start", input=script_input_path, output=video_output_path, export=export_mode, draft=draft or None)
+    try:
+        with profiled(profile_path):
+            render_course(script_input_path, video_output_path, assets_dir, workers, export_mode, full_rebuild, renditions, draft)
+    finally:
+        summary(time.time() - started)
+
+def render_course(script_input_path, video_output_path, assets_dir, workers=1, export_mode="single", full_rebuild=False,
+                  renditions=DEFAULT_RENDITIONS, draft=False):
+    """
+    Render the course script at script_input_path into video_output_path.
+    export_mode "single" writes the timeline in one moviepy pass; "segments" encodes each
+    timeline segment in parallel and stitches them with ffmpeg, re-encoding only segments
+    whose slide changed; "hls"/"fmp4" publish a growing HLS playlist while slides render;
+    "abr" does the same for each of renditions from the one set of rendered frames.
+    Slide artifacts are kept in assets_dir with a build manifest, so reruns only re-render
+    slides whose content changed. full_rebuild ignores the manifest.
+    draft renders a quick single-pass preview instead (see encode_course); its slides come from
+    the same layout code and are reused by the next full render when unchanged.
+    """
     logging.info("Starting video generation process...")
     logging.info(f"Input script JSON: {script_input_path}")
     logging.info(f"Output video path: {video_output_path}")
@@ -531,13 +809,10 @@ def main(script_input_path, video_output_path, assets_dir):
         logging.error(f"Error loading course script from {script_input_path}: {e}")
         sys.exit(1)
 
-    template_path = os.path.join(os.path.dirname(__file__), '..', '..', DEFAULT_TEMPLATE_PATH) # Assume template in project root
     try:
-        with open(template_path, "r", encoding='utf-8') as f:
-            template = json.load(f)
-        logging.info(f"Template loaded successfully from {template_path}")
+        template = get_template()
     except Exception as e:
-        logging.error(f"Error loading template from {template_path}: {e}")
+        logging.error(f"Error loading template from {TEMPLATE_FILE}: {e}")
         sys.exit(1)
 
     # --- Process Slides ---
@@ -546,13 +821,54 @@ def main(script_input_path, video_output_path, assets_dir):
         logging.error("No slides found in the course script.")
         sys.exit(1)
 
+    manifest_path = os.path.join(assets_dir, MANIFEST_FILENAME)
+    if full_rebuild and os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    manifest = BuildManifest(manifest_path)
+    manifest.prune([slide.get("slideNumber", 1) for slide in slides])
+
+    audio_cache_hits = generate_slides_audio(slides, assets_dir, manifest, draft=draft)
+    tts_hits = sum(audio_cache_hits)
+    logging.info(f"TTS cache: {tts_hits} hits, {len(slides) - tts_hits} misses ({TTS_CACHE_DIR})")
+
+    generate_slide_images(slides, assets_dir, draft=draft)
+
+    fps = 10
+    if draft:
+        if export_mode != "single":
+            logging.info(f"Draft renders are always a single pass; ignoring --export {export_mode}")
+        export_mode = "single"
+        fps = DRAFT_FPS
+    if export_mode in STREAM_SEGMENT_TYPES:
+        stream_course(slides, template, assets_dir, video_output_path, fps, workers, manifest, export_mode, renditions)
+        cleanup_assets(assets_dir, manifest)
+        return
+
+    prepared_slides = prepare_slides(slides, template, assets_dir, workers=workers, manifest=manifest)
+    encode_course(slides, template, prepared_slides, video_output_path, assets_dir, fps, export_mode, workers, manifest, draft)
+
+def draft_clip(clip):
+    """A slide clip scaled by DRAFT_SCALE to even dimensions, which x264 needs."""
+    from moviepy.video.fx.resize import resize
+
+    width, height = (max(2, int(side * DRAFT_SCALE) // 2 * 2) for side in clip.size)
+    return resize(clip, newsize=(width, height))  # Resized once: an ImageClip's filters are applied up front
+
+def encode_course(slides, template, prepared_slides, video_output_path, assets_dir, fps, export_mode, workers, manifest, draft=False):
+    """
+    Build the clips of prepared slides, lay them out on the timeline and write the video.
+    A draft scales every clip down by DRAFT_SCALE, replaces transitions with cuts that keep the
+    full render's timing and encodes with the DRAFT_PRESET x264 preset.
+    """
+    from timeline import build_timeline, TimelineClip
+
     clips = []
     transitions = []
     slide_type = []
-    output_dir = os.path.dirname(video_output_path)
-
-    for i, slide in enumerate(course_script.get("slides", [])):
-        clip = process_slide(slide, template, assets_dir)
+    for i, slide in enumerate(slides):
+        clip = build_slide_clip(slide, template, prepared_slides[i])
+        if draft:
+            clip = draft_clip(clip)
         logging.info(f"Successfully generated {len(clips)} individual slide clips.")
 
         transition = slide.get("transition", "slide_left")
@@ -562,35 +878,94 @@ def main(script_input_path, video_output_path, assets_dir):
         slide_type.append(type_slide)
         clips.append(clip)
     
-    length = len(clips)
-    
-    for i in range(length-1, 0, -1):
-        clip = apply_transition(clips[i-1], clips[i], transition_type=transitions[i-1], duration=1.7)
-        if slide_type[i] == "unordered_list_slide" and slide_type[i-1] == "unordered_list_slide":
-            clip = concatenate_videoclips([clips[i-1], clips[i]])
-        clips.pop()
-        clips.pop()
-        clips.append(clip)
-    
     if not clips:
-        st.error("No slides were processed successfully.")
+        logging.error("No slides were processed successfully.")
         return
-    
-    final_video = clips[0]
+
+    # Lay every slide and transition out on one flat timeline instead of nesting clips pairwise
+    with span("timeline"):
+        segments = build_timeline([clip.duration for clip in clips], transitions, slide_type, TRANSITION_DURATION)
+        final_video = TimelineClip(segments, clips, TRANSITION_BACKGROUND_IMAGE, with_audio=TTS_MODE != "course", cuts=draft)
+    voiceover_path = assemble_voiceover(segments, slides, assets_dir) if TTS_MODE == "course" else None
     output_path =  video_output_path
     
     logging.info(f"Writing final video to {video_output_path}...")
     # Ensure fps is not None and assign a default value if necessary
-    fps = 10
     if fps is None:
         fps = 10  # Default FPS value
-    final_video.write_videofile(output_path, fps=fps, logger=None)
+    encoder_options = {"preset": DRAFT_PRESET} if draft else {}
+    with span("encode", export=export_mode, draft=draft or None) as record:
+        if export_mode == "segments":
+            from segment_export import export_segmented
+
+            segment_cache = DiskCache(SEGMENT_CACHE_DIR, SEGMENT_CACHE_MAX_BYTES, suffix=".mp4")
+            export_segmented(final_video, build_slide_clip, slides, template, prepared_slides, TRANSITION_BACKGROUND_IMAGE,
+                             output_path, fps, os.path.join(assets_dir, "segments"), workers=workers, cache=segment_cache,
+                             audio_path=voiceover_path, worker_setup=partial(configure_worker, worker_settings()))
+        elif voiceover_path:
+            # moviepy muxes an audio file with -acodec copy; the later -c:a encodes the PCM once, as
+            # moviepy would have encoded its own temporary audio file
+            final_video.write_videofile(output_path, fps=fps, audio=voiceover_path, ffmpeg_params=["-c:a", "libmp3lame", "-ar", "44100"],
+                                        logger=EncodeProgress() if events_enabled() else None, **encoder_options)
+        else:
+            final_video.write_videofile(output_path, fps=fps, logger=EncodeProgress() if events_enabled() else None, **encoder_options)
+        record["bytes"] = os.path.getsize(output_path)
     logging.info("Final video written successfully!")
+    logging.info(f"Asset registry: {asset_stats()}")
+
+    cleanup_assets(assets_dir, manifest)
 
-    # Remove the temp_assets folder if present
+def stream_course(slides, template, assets_dir, video_output_path, fps, workers, manifest, export_mode, renditions=DEFAULT_RENDITIONS):
+    """
+    Render the course straight into a growing HLS playlist next to video_output_path.
+    Slide durations come from the already synthesized voiceovers, so the whole timeline is laid
+    out up front and each slide's frames are encoded as soon as that slide has been prepared.
+    """
+    from moviepy.audio.io.AudioFileClip import AudioFileClip
+    from timeline import build_timeline, TimelineClip, TimelineAudioClip
+
+    durations = []
+    audio_clips = []
+    for slide in slides:
+        audio_path = audio_path_for(slide, assets_dir)
+        if TTS_MODE == "course":
+            audio_duration = wav_duration(audio_path)
+        else:
+            audio_clips.append(AudioFileClip(audio_path))
+            audio_duration = audio_clips[-1].duration
+        durations.append(slide_clip_duration(slide.get("type", "content_slide"), audio_duration))
+    transitions = [slide.get("transition", "slide_left") for slide in slides]
+    slide_types = [slide.get("type", "content_slide") for slide in slides]
+    segments = build_timeline(durations, transitions, slide_types, TRANSITION_DURATION)
+    if TTS_MODE == "course":
+        voiceover = assemble_voiceover(segments, slides, assets_dir)
+    else:
+        voiceover = TimelineAudioClip(segments, audio_clips)
+
+    clips = StreamedClips(iter_prepare_slides(slides, template, assets_dir, workers=workers, manifest=manifest),
+                          build_slide_clip, slides, template)
+    timeline = TimelineClip(segments, clips, TRANSITION_BACKGROUND_IMAGE, with_audio=False)
+    # Slides are prepared while this encodes, so their spans overlap this one
+    with span("encode", export=export_mode) as record:
+        export_stream(timeline, voiceover, video_output_path, fps,
+                      export_mode=export_mode, work_dir=assets_dir, renditions=renditions)
+        record["bytes"] = os.path.getsize(video_output_path)
+    clips.finish()
+    logging.info("Final video written successfully!")
+    logging.info(f"Asset registry: {asset_stats()}")
+
+def cleanup_assets(assets_dir, manifest):
+    """
+    Remove everything in assets_dir except the slide artifacts the next build can reuse.
+    Slide images of a renderer without keep_slides go too, so those slides are drawn again.
+    """
+    keep = {'final_course.mp4', MANIFEST_FILENAME}
+    kept_paths = ("image_path", "audio_path", "generated_image_path") if get_slide_renderer().keep_slides else ("audio_path", "generated_image_path")
+    for entry in manifest.entries.values():
+        keep.update(os.path.basename(entry[key]) for key in kept_paths if entry.get(key))
     if os.path.exists(assets_dir):
         for filename in os.listdir(assets_dir):
-            if filename =='final_course.mp4':
+            if filename in keep:
                 continue
             file_path = os.path.join(assets_dir, filename)
             try:
@@ -601,16 +976,205 @@ def main(script_input_path, video_output_path, assets_dir):
             except Exception as e:
                 logging.error(f"Error deleting {file_path}: {e}")
 
-if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        # print("Usage: python generate_video.py <input_json_path> <output_video_path> <assets_dir_path>")
-        sys.exit(1)
+# --- Batch Mode ---
+BATCH_EXPORT_MODES = ("single", "segments") # Streaming exports prepare their own slides while encoding
+
+def run_batch(batch_path, workers=1, memory_mb=BATCH_MEMORY_MB):
+    """
+    Render every course of a batch manifest (see batch.load_batch) in this one process.
+    Voiceovers and generated images are produced course by course through the shared caches.
+    The slides of all courses are then prepared on a single process pool, taken from the
+    courses in turn and limited to what fits in memory_mb, and each course is encoded on a
+    background thread as soon as its last slide is ready.
+    Returns the batch summary, including courses per hour.
+    """
+    started = time.time()
+    jobs = load_batch(batch_path)
+    template = get_template()
+    fps = 10
+    take_totals()
+    logging.info(f"Batch of {len(jobs)} courses from {batch_path} with {workers} workers and a {memory_mb} MB budget")
+
+    courses = {}
+    results = []
+
+    def finish(course_id, error=None):
+        course = courses.pop(course_id)
+        job = course["job"]
+        if error is None:
+            results.append({"id": course_id, "status": "ok", "output_video": job["output_video"],
+                            "slides": len(course["slides"]), "elapsed": round(time.time() - started, 2)})
+        else:
+            results.append({"id": course_id, "status": "error", "error": str(error), "slides": len(course["slides"])})
+        emit("progress", stage="batch", course=course_id, status=results[-1]["status"], done=len(results), total=len(jobs))
+
+    for job in jobs:
+        courses[job["id"]] = {"job": job, "slides": []}
+        try:
+            export_mode = job.get("export", "single")
+            if export_mode not in BATCH_EXPORT_MODES:
+                raise ValueError(f"export '{export_mode}' is not supported in batch mode; use one of {', '.join(BATCH_EXPORT_MODES)}")
+            with open(job["input_json"], "r", encoding='utf-8') as f:
+                slides = json.load(f).get("slides", [])
+            if not slides:
+                raise ValueError("no slides found in the course script")
+            courses[job["id"]]["slides"] = slides
+            os.makedirs(job["assets_dir"], exist_ok=True)
+            manifest_path = os.path.join(job["assets_dir"], MANIFEST_FILENAME)
+            if job.get("full_rebuild") and os.path.exists(manifest_path):
+                os.remove(manifest_path)
+            manifest = BuildManifest(manifest_path)
+            manifest.prune([slide.get("slideNumber", 1) for slide in slides])
+            generate_slides_audio(slides, job["assets_dir"], manifest)
+            generate_slide_images(slides, job["assets_dir"])
+        except Exception as e:
+            logging.exception(f"Course {job['id']} failed before rendering")
+            finish(job["id"], e)
+            continue
+        courses[job["id"]].update(export_mode=export_mode, manifest=manifest, prepared=[None] * len(slides),
+                                  remaining=len(slides), error=None)
+
+    def encode(course_id):
+        course = courses[course_id]
+        job = course["job"]
+        encode_course(course["slides"], template, course["prepared"], job["output_video"], job["assets_dir"], fps,
+                      course["export_mode"], 1, course["manifest"])
+
+    def on_done(course_id, index, result, error):
+        course = courses[course_id]
+        if error is not None:
+            course["error"] = course["error"] or error
+        else:
+            prepared, _pid, _elapsed, _decodes, totals = result
+            merge_totals(totals)
+            course["prepared"][index] = prepared
+            _record_prepared(course["manifest"], prepared)
+        course["remaining"] -= 1
+        if course["remaining"] == 0:
+            if course["error"] is not None:
+                finish(course_id, course["error"])
+            else:
+                encodes[course_id] = encoder.submit(encode, course_id)
+
+    tasks = {course_id: [(slide, template, course["job"]["assets_dir"], course["manifest"].get(slide.get("slideNumber", 1)))
+                         for slide in course["slides"]]
+             for course_id, course in courses.items()}
+    encodes = {}
+    with worker_pool(workers) as pool, ThreadPoolExecutor(max_workers=1) as encoder:
+        FairScheduler(pool, max_in_flight(memory_mb, workers)).run(tasks, _prepare_slide_task, on_done)
+        for course_id, future in encodes.items():
+            try:
+                future.result()
+                finish(course_id)
+            except Exception as e:
+                logging.exception(f"Course {course_id} failed while encoding")
+                finish(course_id, e)
 
-    input_json = sys.argv[1]
-    output_video = sys.argv[2]
-    assets_directory = sys.argv[3]
+    wall_time = time.time() - started
+    summary(wall_time)
+    batch_summary = report(results, wall_time)
+    emit("batch", **{key: value for key, value in batch_summary.items() if key != "results"})
+    return batch_summary
+
+# --- Worker Daemon ---
+def warm_up():
+    """
+    Load everything a render job would otherwise pay for on first use: the modules one-shot runs
+    import lazily (moviepy, the timeline and exporters, Pygments), the TTS backend, the
+    background and transition plates, template fonts and the chart canvas.
+    """
+    started = time.time()
+    # timeline and segment_export bring in moviepy's clip, compositing and ffmpeg writer modules
+    import timeline
+    import segment_export
+    from moviepy.audio.io.AudioFileClip import AudioFileClip
+    from moviepy.video.fx.resize import resize
+    for lexer in LEXERS:
+        get_lexer(lexer)
+    render_snippet("x", DEFAULT_LEXER, CODE_FONT_SIZE)  # Loads ImageFormatter and its fonts
+    get_template()
+    get_tts_backend()
+    get_image_generator()
+    height, width = rgba_array(DEFAULT_BACKGROUND_IMAGE).shape[:2]
+    if SLIDE_RENDERER == "wand":
+        wand_image(DEFAULT_BACKGROUND_IMAGE)
+    plate_array(TRANSITION_BACKGROUND_IMAGE, (width, height))
+    _chart_canvas()
+    logging.info(f"Render worker warmed up in {time.time() - started:.1f}s")
+
+def run_job(request):
+    """
+    Run one render job from the worker protocol. request holds input_json, output_video and
+    assets_dir, plus optional workers, export, full_rebuild, profile, renditions and draft like the CLI flags.
+    Events emitted during the job carry its id.
+    """
+    started = time.time()
+    job_id = request.get("id")
+    set_context(job=job_id)
+    try:
+        os.makedirs(request["assets_dir"], exist_ok=True)
+        main(request["input_json"], request["output_video"], request["assets_dir"],
+             workers=int(request.get("workers", 1)), export_mode=request.get("export", "single"),
+             full_rebuild=bool(request.get("full_rebuild", False)), profile_path=request.get("profile"),
+             renditions=request.get("renditions", DEFAULT_RENDITIONS), draft=bool(request.get("draft", False)))
+    except KeyError as e:
+        return {"id": job_id, "status": "error", "error": f"missing field {e}"}
+    except SystemExit:
+        return {"id": job_id, "status": "error", "error": "video generation failed, see the worker log"}
+    finally:
+        set_context()
+    return {"id": job_id, "status": "ok", "output_video": request["output_video"], "elapsed": round(time.time() - started, 2)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a course video from a slide script.")
+    parser.add_argument("input_json", nargs="?", help="Path to the course script JSON")
+    parser.add_argument("output_video", nargs="?", help="Path of the video file to write")
+    parser.add_argument("assets_dir", nargs="?", help="Directory for intermediate slide assets")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes used to prepare slides (default: 1, sequential)")
+    parser.add_argument("--export", choices=["single", "segments", "hls", "fmp4", "abr"], default="single", help="single moviepy pass, parallel per-segment encoding stitched with ffmpeg, a growing HLS playlist of MPEG-TS (hls) or fragmented MP4 (fmp4) segments published while slides render, or an adaptive bitrate HLS ladder of --renditions encoded from one render (abr) (default: %(default)s)")
+    parser.add_argument("--renditions", nargs="+", choices=list(RENDITIONS), default=DEFAULT_RENDITIONS, help="With --export abr, the renditions to encode (default: %(default)s)")
+    parser.add_argument("--tts-backend", default=TTS_BACKEND, help="TTS backend: azure, silence or espeak (default: %(default)s)")
+    parser.add_argument("--image-generator", default=IMAGE_GENERATOR, help="Slide image generator: node or stub (default: %(default)s)")
+    parser.add_argument("--slide-renderer", choices=list(SLIDE_RENDERERS), default=SLIDE_RENDERER, help="Slide rasterizer: ImageMagick through Wand, or Pillow drawing into a reused buffer and handing slides over as raw RGBA (default: %(default)s)")
+    parser.add_argument("--image-concurrency", type=int, default=IMAGE_GEN_CONCURRENCY, help="Maximum image generation requests in flight (default: %(default)s)")
+    parser.add_argument("--full-rebuild", action="store_true", help="Ignore the build manifest and re-render every slide")
+    parser.add_argument("--draft", action="store_true", help=f"Quick preview: the same slide layout and timing at {DRAFT_SCALE:g}x resolution and {DRAFT_FPS} fps with cut transitions and a fast encode, using cached voiceovers and images or placeholders")
+    parser.add_argument("--tts-mode", choices=["slides", "course"], default=TTS_MODE, help="slides: one TTS request per slide; course: the whole course in a few SSML requests cut at per-slide bookmarks, with the voiceover assembled from PCM (default: %(default)s)")
+    parser.add_argument("--tts-concurrency", type=int, default=TTS_MAX_IN_FLIGHT, help="Maximum TTS requests in flight (default: %(default)s)")
+    parser.add_argument("--serve", action="store_true", help="Run as a long-lived worker that takes JSON-lines job requests on stdin (or --socket) and keeps imports, TTS clients and assets warm")
+    parser.add_argument("--socket", help="With --serve, listen on this Unix socket instead of stdin/stdout")
+    parser.add_argument("--max-queued", type=int, default=DEFAULT_MAX_QUEUED_JOBS, help="With --serve, jobs that can wait before new ones are rejected (default: %(default)s)")
+    parser.add_argument("--batch", metavar="MANIFEST", help="Render every course in a JSON list of {input_json, output_video, assets_dir} jobs on one shared worker pool")
+    parser.add_argument("--memory-mb", type=int, default=BATCH_MEMORY_MB, help="With --batch, memory budget for slide renders in flight (default: %(default)s)")
+    parser.add_argument("--events-fd", type=int, help="Write JSON-lines timing and progress events to this already open file descriptor (e.g. 3)")
+    parser.add_argument("--profile", help="Write a cProfile dump of the run to this path")
+    args = parser.parse_args()
+
+    TTS_BACKEND = args.tts_backend
+    TTS_MAX_IN_FLIGHT = args.tts_concurrency
+    TTS_MODE = args.tts_mode
+    IMAGE_GENERATOR = args.image_generator
+    IMAGE_GEN_CONCURRENCY = args.image_concurrency
+    SLIDE_RENDERER = args.slide_renderer
+    if args.events_fd is not None:
+        open_events(args.events_fd)
+
+    if args.serve:
+        warm_up()
+        if args.socket:
+            serve_socket(run_job, args.socket, max_queued=args.max_queued)
+        else:
+            serve_stdio(run_job, max_queued=args.max_queued)
+        sys.exit(0)
+    if args.batch:
+        with profiled(args.profile):
+            batch_summary = run_batch(args.batch, workers=args.workers, memory_mb=args.memory_mb)
+        sys.exit(0 if batch_summary["succeeded"] == batch_summary["courses"] else 1)
+    if not (args.input_json and args.output_video and args.assets_dir):
+        parser.error("input_json, output_video and assets_dir are required unless --serve or --batch is given")
 
     # Ensure assets directory exists
-    os.makedirs(assets_directory, exist_ok=True)
+    os.makedirs(args.assets_dir, exist_ok=True)
 
-    main(input_json, output_video, assets_directory)
+    main(args.input_json, args.output_video, args.assets_dir, workers=args.workers, export_mode=args.export,
+         full_rebuild=args.full_rebuild, profile_path=args.profile, renditions=args.renditions, draft=args.draft)
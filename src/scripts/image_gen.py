@@ -0,0 +1,139 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+import subprocess
+
+from render_cache import DiskCache
+
+NODE_IMAGE_SCRIPT = os.path.join("src", "ai", "flows", "generate-image.js")
+
+
+class ImageGenerator:
+    """
+    Interface for slide image generators.
+    generate_many() is blocking and writes one image per (prompt, ratio, output_path) job.
+    """
+    name = "base"
+
+    def cache_identity(self):
+        """Everything besides prompt and ratio that changes the produced image, used in the cache key."""
+        raise NotImplementedError
+
+    def generate_many(self, jobs, max_concurrency):
+        """Generate every job, returning the set of output paths that were written."""
+        raise NotImplementedError
+
+
+class NodeImageGenerator(ImageGenerator):
+    """Runs every job through one generate-image.js --generate-batch process."""
+    name = "node"
+
+    def __init__(self, script=NODE_IMAGE_SCRIPT):
+        self.script = script
+
+    def cache_identity(self):
+        return (self.name,)
+
+    def generate_many(self, jobs, max_concurrency):
+        fd, jobs_path = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            # Prompts are quoted the way the per-slide command line always passed them
+            json.dump([{"prompt": f"'{prompt}'", "ratio": ratio, "output": output_path}
+                       for prompt, ratio, output_path in jobs], f)
+        command = ["node", "--experimental-modules", self.script, "--generate-batch", jobs_path, str(max_concurrency)]
+        try:
+            result = subprocess.run(command, capture_output=True, text=True)
+        finally:
+            os.remove(jobs_path)
+        if result.returncode != 0:
+            logging.error(f"Image generation batch failed: {result.stderr}")
+
+        written = set()
+        for line in result.stdout.splitlines():
+            if not line.startswith("{"):
+                continue  # Progress messages from generate-image.js
+            status = json.loads(line)
+            if status.get("ok"):
+                written.add(status["output"])
+            else:
+                logging.error(f"Error generating image {status.get('output')}: {status.get('error')}")
+        return written
+
+
+class StubImageGenerator(ImageGenerator):
+    """Draws a flat image coloured by the prompt, without a network call; --draft uses it for missing images."""
+    name = "stub"
+
+    def cache_identity(self):
+        return (self.name,)
+
+    def generate_many(self, jobs, max_concurrency):
+        from PIL import Image
+
+        written = set()
+        for prompt, ratio, output_path in jobs:
+            size = (1024, 1024) if ratio in ("1x1", "1:1") else (1536, 1024)
+            color = tuple(hashlib.sha256(prompt.encode("utf-8")).digest()[:3])
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            Image.new("RGB", size, color).save(output_path, "JPEG")
+            written.add(output_path)
+        return written
+
+
+IMAGE_GENERATORS = {
+    "node": NodeImageGenerator,
+    "stub": StubImageGenerator,
+}
+
+
+def create_generator(name, **kwargs):
+    """Instantiate a generator from IMAGE_GENERATORS by name."""
+    try:
+        generator_class = IMAGE_GENERATORS[name]
+    except KeyError:
+        raise ValueError(f"Unknown image generator '{name}'. Choose from: {', '.join(IMAGE_GENERATORS)}")
+    return generator_class(**kwargs)
+
+
+def generate_images(requests, generator, cache=None, max_concurrency=4, fallback=None):
+    """
+    Produce the image for every (prompt, ratio, output_path) request.
+    Identical prompts are generated once, cached images are copied instead of regenerated, and
+    all remaining prompts go to the generator in a single batch. With a fallback generator
+    (e.g. the stub for drafts), prompts missing from the cache are drawn by it instead and
+    never cached, so a placeholder is never mistaken for the real image later.
+    Returns the set of output paths that now hold an image.
+    """
+    by_key = {}
+    for prompt, ratio, output_path in requests:
+        key = DiskCache.make_key(prompt, ratio, *generator.cache_identity())
+        by_key.setdefault(key, (prompt, ratio, []))[2].append(output_path)
+
+    ready = set()
+    missing = {}
+    for key, (prompt, ratio, output_paths) in by_key.items():
+        if cache is not None and cache.get(key, output_paths[0]):
+            ready.add(output_paths[0])
+        else:
+            missing[key] = (prompt, ratio, output_paths)
+
+    if missing:
+        producer = fallback or generator
+        logging.info(f"Generating {len(missing)} images ({len(by_key) - len(missing)} cached) with the '{producer.name}' generator...")
+        written = producer.generate_many([(prompt, ratio, output_paths[0]) for prompt, ratio, output_paths in missing.values()],
+                                         max_concurrency)
+        for key, (_prompt, _ratio, output_paths) in missing.items():
+            if output_paths[0] in written:
+                ready.add(output_paths[0])
+                if cache is not None and fallback is None:
+                    cache.put(key, output_paths[0])
+
+    for _prompt, _ratio, output_paths in by_key.values():
+        if output_paths[0] in ready:
+            for output_path in output_paths[1:]:
+                shutil.copyfile(output_paths[0], output_path)
+                ready.add(output_path)
+    return ready
@@ -0,0 +1,138 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+
+# An over-budget cache is trimmed to this fraction of max_bytes, so a full cache is not
+# rescanned on every write
+EVICT_LOW_WATER = 0.9
+
+
+def file_digest(path, digest=None):
+    """Feed a file's bytes into a sha256 digest (a new one unless given) and return it."""
+    digest = digest or hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest
+
+
+class DiskCache:
+    """
+    Persistent content-addressed file cache.
+    Entries are stored under the hash of whatever identifies their content and evicted
+    least-recently-used first once the directory grows past max_bytes.
+    The directory is scanned once per process to learn its size, which is then kept up to date
+    with this process's own writes; other processes' writes are picked up at the next eviction.
+    """
+
+    def __init__(self, cache_dir, max_bytes, suffix=""):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self._total_bytes = None  # Size of the directory as this process knows it, None until scanned
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts):
+        """Hash the given JSON-serialisable parts into a cache key."""
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def get(self, key, dest_path):
+        """Copy the cached entry to dest_path. Returns True on a hit."""
+        cached_path = self.path_for(key)
+        try:
+            shutil.copyfile(cached_path, dest_path)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        os.utime(cached_path)  # Mark as recently used for LRU eviction
+        self.hits += 1
+        return True
+
+    def read(self, key):
+        """Return the cached entry's bytes, or None on a miss."""
+        cached_path = self.path_for(key)
+        try:
+            with open(cached_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        os.utime(cached_path)
+        self.hits += 1
+        return data
+
+    def put(self, key, src_path):
+        """Store a copy of src_path under key, then evict old entries if over budget."""
+        self._store(key, lambda tmp_path: shutil.copyfile(src_path, tmp_path))
+
+    def write(self, key, data):
+        """Store data (bytes) under key, then evict old entries if over budget."""
+        def write_data(tmp_path):
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+        self._store(key, write_data)
+
+    def _store(self, key, fill):
+        path = self.path_for(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            fill(tmp_path)
+            added = os.path.getsize(tmp_path)
+            try:
+                added -= os.path.getsize(path)  # Replacing an entry only adds the difference
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, path)  # Atomic so concurrent readers never see partial files
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if self._total_bytes is None:
+            self.evict()
+        else:
+            self._total_bytes += added
+            if self._total_bytes > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """Once the cache is over max_bytes, remove least recently used entries down to EVICT_LOW_WATER of it."""
+        entries = []
+        total = 0
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith(".tmp"):
+                continue
+            path = os.path.join(self.cache_dir, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        limit = self.max_bytes if total <= self.max_bytes else self.max_bytes * EVICT_LOW_WATER
+        for _mtime, size, path in entries:
+            if total <= limit:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logging.warning(f"Could not evict cache entry {path}: {e}")
+        self._total_bytes = total
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import queue
+import logging
+import threading
+import socketserver
+
+DEFAULT_MAX_QUEUED_JOBS = 4
+FINAL_STATUSES = ("ok", "error")  # Responses that end a queued job
+
+
+class JobQueue:
+    """
+    Bounded FIFO of render jobs run one at a time on a background thread.
+    Each job is a request dict plus the callable its response line is sent through.
+    """
+
+    def __init__(self, run_job, max_queued=DEFAULT_MAX_QUEUED_JOBS):
+        self._run_job = run_job
+        self._jobs = queue.Queue(maxsize=max_queued)
+        self._submit_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._work, name="render-jobs", daemon=True)
+        self._thread.start()
+
+    def submit(self, request, respond):
+        """Queue a job, or reject it straight away when the queue is full."""
+        # Only submit() adds jobs, so under this lock a queue that is not full stays that way
+        # until the put, and "queued" always reaches the client before the job's result
+        with self._submit_lock:
+            if self._jobs.full():
+                respond({"id": request.get("id"), "status": "rejected", "error": "job queue is full"})
+                return
+            respond({"id": request.get("id"), "status": "queued", "position": self._jobs.qsize() + 1})
+            self._jobs.put_nowait((request, respond))
+
+    def join(self):
+        """Wait for every queued job to finish."""
+        self._jobs.join()
+
+    def _work(self):
+        while True:
+            request, respond = self._jobs.get()
+            try:
+                respond(self._run_job(request))
+            except Exception as e:
+                logging.exception(f"Render job {request.get('id')} failed")
+                respond({"id": request.get("id"), "status": "error", "error": str(e)})
+            finally:
+                self._jobs.task_done()
+
+
+def _handle_line(line, jobs, respond):
+    line = line.strip()
+    if not line:
+        return
+    try:
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            raise ValueError("a job request must be a JSON object")
+    except ValueError as e:
+        respond({"status": "error", "error": f"invalid request: {e}"})
+        return
+    jobs.submit(request, respond)
+
+
+def serve_stdio(run_job, max_queued=DEFAULT_MAX_QUEUED_JOBS):
+    """
+    Read one JSON job request per line from stdin and write one JSON response per line to stdout
+    until stdin closes. Everything else the process prints, including child processes, is moved
+    to stderr so stdout only carries the protocol.
+    """
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), "w", buffering=1)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    lock = threading.Lock()
+
+    def respond(response):
+        with lock:
+            protocol.write(json.dumps(response) + "\n")
+
+    jobs = JobQueue(run_job, max_queued)
+    respond({"status": "ready", "pid": os.getpid()})
+    for line in sys.stdin:
+        _handle_line(line, jobs, respond)
+    jobs.join()
+
+
+def serve_socket(run_job, socket_path, max_queued=DEFAULT_MAX_QUEUED_JOBS):
+    """Accept the same JSON-lines protocol on a Unix socket. Jobs from all connections share one queue."""
+    jobs = JobQueue(run_job, max_queued)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            done = threading.Condition()
+            outstanding = [0]
+
+            def respond(response):
+                with done:
+                    try:
+                        self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+                        self.wfile.flush()
+                    except OSError:
+                        pass  # Client went away; the job still finishes and is recorded
+                    if response.get("status") == "queued":
+                        outstanding[0] += 1
+                    elif response.get("status") in FINAL_STATUSES and "id" in response and outstanding[0]:
+                        outstanding[0] -= 1
+                        done.notify_all()
+
+            for line in self.rfile:
+                _handle_line(line.decode("utf-8"), jobs, respond)
+            # Keep the connection open until this client's queued jobs have answered
+            with done:
+                done.wait_for(lambda: outstanding[0] == 0)
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    with socketserver.ThreadingUnixStreamServer(socket_path, Handler) as server:
+        logging.info(f"Render worker {os.getpid()} listening on {socket_path}")
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(socket_path)
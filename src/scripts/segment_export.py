@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from moviepy.config import get_setting
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+from events import emit
+from render_cache import DiskCache, file_digest
+from timeline import TimelineClip
+
+SEGMENT_CODEC = "libx264"
+SEGMENT_PRESET = "medium"
+# Part of every segment's cache key. Cached segments outlive upgrades, so bump this with any change
+# to how a slide clip or transition is drawn (overlays, flatten(), TimelineClip) to re-encode them.
+SEGMENT_FORMAT_VERSION = 1
+
+
+class LazyClips:
+    """Slide clips built on first access, so a worker only loads the slides it actually encodes."""
+
+    def __init__(self, build_clip, slides, template, prepared_slides):
+        self._build_clip = build_clip
+        self._slides = slides
+        self._template = template
+        self._prepared_slides = prepared_slides
+        self._clips = {}
+
+    def __len__(self):
+        return len(self._slides)
+
+    def __getitem__(self, index):
+        if index not in self._clips:
+            self._clips[index] = self._build_clip(self._slides[index], self._template, self._prepared_slides[index])
+        return self._clips[index]
+
+
+def slide_fingerprint(slide_data, prepared, duration):
+    """Hash everything that determines a slide clip's frames: its JSON, rendered images and length."""
+    digest = hashlib.sha256(json.dumps(slide_data, sort_keys=True).encode("utf-8"))
+    digest.update(str(duration).encode("utf-8"))
+    for key in ("image_path", "generated_image_path"):
+        if prepared.get(key):
+            file_digest(prepared[key], digest)
+    return digest.hexdigest()
+
+
+def plan_chunks(timeline, fps):
+    """
+    Split the output frames into one chunk per timeline segment.
+    Frame times are the same np.arange() grid write_videofile() samples, so stitching the
+    chunks back together reproduces the single-pass frame sequence exactly.
+    """
+    chunks = []
+    for t in np.arange(0, timeline.duration, 1.0 / fps):
+        index = timeline.segment_at(t)
+        if chunks and chunks[-1][0] == index:
+            chunks[-1][1].append(t)
+        else:
+            chunks.append((index, [t]))
+    return chunks
+
+
+_worker_timeline = None
+
+
+def _init_worker(segments, build_clip, slides, template, prepared_slides, background_path, worker_setup):
+    global _worker_timeline
+    if worker_setup is not None:
+        worker_setup()
+    clips = LazyClips(build_clip, slides, template, prepared_slides)
+    _worker_timeline = TimelineClip(segments, clips, background_path, with_audio=False)
+
+
+def _encode_chunk(task):
+    times, path, fps = task
+    writer = FFMPEG_VideoWriter(path, _worker_timeline.size, fps, codec=SEGMENT_CODEC, preset=SEGMENT_PRESET)
+    try:
+        for _t, frame in _worker_timeline.frames(times):
+            writer.write_frame(frame)
+    finally:
+        writer.close()
+    return path
+
+
+def export_segmented(timeline, build_clip, slides, template, prepared_slides, background_path,
+                     output_path, fps, work_dir, workers=1, cache=None, audio_path=None,
+                     worker_setup=None):
+    """
+    Encode every timeline segment as its own video file on a process pool, reusing cached
+    segments from earlier renders, then stitch them with ffmpeg's concat demuxer (stream copy)
+    and mux the voiceover track in a single pass. audio_path is a ready voiceover WAV to use
+    instead of rendering the timeline's audio. worker_setup, if given, runs first in every
+    worker process so the caller can hand over its settings.
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    ffmpeg = get_setting("FFMPEG_BINARY")
+    started = time.time()
+
+    template_digest = template.digest
+    background_digest = file_digest(background_path).hexdigest()
+    fingerprints = [slide_fingerprint(slide, prepared, timeline.clips[i].duration)
+                    for i, (slide, prepared) in enumerate(zip(slides, prepared_slides))]
+
+    chunk_paths = []
+    chunk_keys = []
+    tasks = []
+    for number, (segment_index, times) in enumerate(plan_chunks(timeline, fps)):
+        segment = timeline.segments[segment_index]
+        chunk_path = os.path.join(work_dir, f"segment_{number:05d}.mp4")
+        key = DiskCache.make_key(
+            SEGMENT_FORMAT_VERSION, fingerprints[segment.slide], template_digest, segment.kind, segment.direction,
+            segment.fade_in, segment.fade_out, segment.end - segment.start,
+            background_digest if segment.kind == "transition" else None,
+            [round(t - segment.start, 6) for t in times], fps, SEGMENT_CODEC, SEGMENT_PRESET,
+        )
+        chunk_paths.append(chunk_path)
+        chunk_keys.append(key)
+        if cache is None or not cache.get(key, chunk_path):
+            tasks.append((list(times), chunk_path, fps))
+
+    logging.info(f"Encoding {len(tasks)} of {len(chunk_paths)} segments ({len(chunk_paths) - len(tasks)} reused) with {workers} workers...")
+    if tasks:
+        keys_by_path = dict(zip(chunk_paths, chunk_keys))
+        initargs = (timeline.segments, build_clip, slides, template, prepared_slides, background_path, worker_setup)
+        with ProcessPoolExecutor(max_workers=max(1, workers), initializer=_init_worker, initargs=initargs) as executor:
+            for done, chunk_path in enumerate(executor.map(_encode_chunk, tasks), 1):
+                # Cache each segment as soon as it is encoded so an interrupted export resumes from here
+                if cache is not None:
+                    cache.put(keys_by_path[chunk_path], chunk_path)
+                emit("progress", stage="encode", done=done, total=len(tasks))
+
+    list_path = os.path.join(work_dir, "segments.txt")
+    with open(list_path, "w", encoding="utf-8") as f:
+        for chunk_path in chunk_paths:
+            f.write(f"file '{os.path.abspath(chunk_path)}'\n")
+
+    command = [ffmpeg, "-y", "-v", "error", "-f", "concat", "-safe", "0", "-i", list_path]
+    if audio_path is None and timeline.audio is not None:
+        audio_path = os.path.join(work_dir, "voiceover.wav")
+        timeline.audio.write_audiofile(audio_path, fps=44100, nbytes=2, codec="pcm_s16le", logger=None)
+    if audio_path is not None:
+        command += ["-i", audio_path, "-map", "0:v", "-map", "1:a", "-c:a", "libmp3lame"]
+    command += ["-c:v", "copy", output_path]
+    subprocess.run(command, check=True, capture_output=True, text=True)
+    logging.info(f"Stitched {len(chunk_paths)} segments into {output_path} in {time.time() - started:.1f}s")
@@ -0,0 +1,286 @@
+import io
+import os
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+
+from assets import rgba_array, wand_image
+
+# Face Pillow draws text styles without a font_path in; ImageMagick falls back to its own default font
+DEFAULT_FONT_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'Inter', 'Inter-Regular.ttf')
+
+
+class SlideCanvas:
+    """
+    One slide being drawn over its background. generate_slide_image() lays a slide out through
+    this interface only, so every renderer places text and images from the same layout code.
+    `draw` is the metrics object text_layout measures with in the current text style.
+    """
+    width = 0
+    height = 0
+    draw = None
+
+    def set_text_style(self, font_path, font_size, color):
+        """Switch the font (None keeps the current one), size and fill colour of following text."""
+        raise NotImplementedError
+
+    def text(self, x, y, line):
+        """Queue a line of text with its baseline starting at (x, y)."""
+        raise NotImplementedError
+
+    def flush_text(self):
+        """Draw the queued text over everything composited so far."""
+        raise NotImplementedError
+
+    def load_png(self, blob):
+        """An image decoded from PNG bytes, with width and height, usable as a context manager."""
+        raise NotImplementedError
+
+    def composite(self, image, left, top):
+        """Composite an image from load_png() over the canvas."""
+        raise NotImplementedError
+
+    def composite_array(self, rgba, left, top):
+        """Composite an (h, w, 4) uint8 RGBA array over the canvas."""
+        raise NotImplementedError
+
+    def save(self, output_path):
+        """Write the finished slide to output_path in the renderer's format."""
+        raise NotImplementedError
+
+
+class SlideRenderer:
+    """
+    Interface for slide rasterizers. canvas() yields a SlideCanvas over a background image;
+    slide images are written with `suffix` and read back for the video stage by load_slide().
+    keep_slides says whether they stay in assets_dir after the encode for the next build to reuse.
+    """
+    name = "base"
+    suffix = ".png"
+    keep_slides = True
+
+    def canvas(self, background_path):
+        raise NotImplementedError
+
+    def metrics(self):
+        """A context manager yielding a bare metrics object, for preloading fonts."""
+        raise NotImplementedError
+
+    def load_slide(self, path, width, height):
+        """The slide image at path as ImageClip accepts it: a filename or an RGBA array."""
+        return path
+
+
+class WandCanvas(SlideCanvas):
+
+    def __init__(self, img, draw):
+        self.img = img
+        self.draw = draw
+        self.width, self.height = img.width, img.height
+        self._fill = None
+
+    def set_text_style(self, font_path, font_size, color):
+        from wand.color import Color
+
+        # Only settings that differ from the previous element's are sent to the drawing
+        if font_path and font_path != self.draw.font:
+            self.draw.font = font_path
+        if color != self._fill:
+            self.draw.fill_color = Color(color)
+            self._fill = color
+        if font_size != self.draw.font_size:
+            self.draw.font_size = font_size
+
+    def text(self, x, y, line):
+        self.draw.text(x, y, line)
+
+    def flush_text(self):
+        self.draw(self.img)
+
+    def load_png(self, blob):
+        from wand.image import Image as WandImage
+
+        return WandImage(blob=blob)
+
+    def composite(self, image, left, top):
+        self.img.composite(image, left=left, top=top)
+
+    def composite_array(self, rgba, left, top):
+        from wand.image import Image as WandImage
+
+        height, width = rgba.shape[:2]
+        with WandImage(blob=rgba.tobytes(), format='rgba', width=width, height=height, depth=8) as image:
+            self.img.composite(image, left=left, top=top)
+
+    def save(self, output_path):
+        self.img.format = 'png'
+        self.img.save(filename=output_path)
+
+
+class WandSlideRenderer(SlideRenderer):
+    """ImageMagick through Wand: slides are drawn as MVG and saved as PNG."""
+    name = "wand"
+
+    @contextmanager
+    def canvas(self, background_path):
+        from wand.color import Color
+        from wand.drawing import Drawing
+        from wand.image import Image as WandImage
+
+        with wand_image(background_path).clone() as background:
+            with WandImage(width=background.width, height=background.height, background=Color('transparent')) as img:
+                img.composite(background, left=0, top=0)
+                with Drawing() as draw:
+                    yield WandCanvas(img, draw)
+
+    def metrics(self):
+        from wand.drawing import Drawing
+
+        return Drawing()
+
+
+class PillowMetrics:
+    """
+    The font state of a Wand Drawing with a measurer of its own, so text_layout never needs
+    ImageMagick for Pillow slides. `engine` keeps its widths apart from ImageMagick's in
+    text_layout's caches.
+    """
+    engine = "pillow"
+
+    def __init__(self, fonts):
+        self._fonts = fonts
+        self.font = None
+        self.font_size = 12
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def face(self):
+        return self._fonts.get(self.font, self.font_size)
+
+    def text_width(self, text):
+        return self.face().getlength(text)
+
+    def extents(self):
+        """(ascender, descender) in pixels, both positive."""
+        return self.face().getmetrics()
+
+
+class PillowFonts:
+    """FreeType faces loaded once per (path, size) and kept open for the life of the process."""
+
+    def __init__(self):
+        self._faces = {}
+
+    def get(self, font_path, font_size):
+        key = (font_path, font_size)
+        face = self._faces.get(key)
+        if face is None:
+            face = ImageFont.truetype(font_path or DEFAULT_FONT_PATH, int(round(font_size)))
+            self._faces[key] = face
+        return face
+
+
+class PillowCanvas(SlideCanvas):
+
+    def __init__(self, image, fonts):
+        self.image = image
+        self.width, self.height = image.size
+        self.draw = PillowMetrics(fonts)
+        self._painter = ImageDraw.Draw(image)
+        self._fill = None
+        self._queued = []
+
+    def set_text_style(self, font_path, font_size, color):
+        if font_path:
+            self.draw.font = font_path
+        self.draw.font_size = font_size
+        self._fill = ImageColor.getrgb(color)
+
+    def text(self, x, y, line):
+        self._queued.append((x, y, line, self.draw.face(), self._fill))
+
+    def flush_text(self):
+        for x, y, line, face, fill in self._queued:
+            self._painter.text((x, y), line, font=face, fill=fill, anchor="ls")
+        self._queued = []
+
+    def load_png(self, blob):
+        image = Image.open(io.BytesIO(blob))
+        return image if image.mode == "RGBA" else image.convert("RGBA")
+
+    def composite(self, image, left, top):
+        # alpha_composite() only takes offsets inside the canvas, so crop what hangs off the top or left
+        left, top = int(left), int(top)
+        if left < 0 or top < 0:
+            image = image.crop((max(0, -left), max(0, -top), image.width, image.height))
+            left, top = max(0, left), max(0, top)
+        if left < self.width and top < self.height and image.width and image.height:
+            self.image.alpha_composite(image, (left, top))
+
+    def composite_array(self, rgba, left, top):
+        self.composite(Image.fromarray(np.ascontiguousarray(rgba), "RGBA"), left, top)
+
+    def save(self, output_path):
+        # Raw RGBA, written atomically: the video stage maps it back without decoding anything,
+        # and a clip still mapping the previous version keeps its own copy of the pixels
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(output_path) or ".", suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(self.image.tobytes())
+        os.replace(tmp_path, output_path)
+
+
+class PillowSlideRenderer(SlideRenderer):
+    """
+    Pillow and NumPy: text is drawn with FreeType faces that stay loaded onto one RGBA buffer
+    reused for every slide of the process, and slides are saved as raw RGBA that the video stage
+    memory-maps, with no PNG encode and decode in between. Draws one slide at a time.
+    The raw files only carry slides to the encode (and to other processes with --workers): at
+    8 MB a slide they are removed afterwards, as drawing a slide again costs less than keeping it.
+    """
+    name = "pillow"
+    suffix = ".rgba"
+    keep_slides = False
+
+    def __init__(self):
+        self._fonts = PillowFonts()
+        self._backgrounds = {}
+        self._buffer = None
+
+    @contextmanager
+    def canvas(self, background_path):
+        pixels = rgba_array(background_path)  # A new array once the file is replaced
+        pixels_seen, background = self._backgrounds.get(background_path, (None, None))
+        if pixels_seen is not pixels:
+            background = Image.fromarray(np.array(pixels), "RGBA")
+            self._backgrounds[background_path] = (pixels, background)
+        if self._buffer is None or self._buffer.size != background.size:
+            self._buffer = Image.new("RGBA", background.size)
+        self._buffer.paste(background, (0, 0))
+        yield PillowCanvas(self._buffer, self._fonts)
+
+    def metrics(self):
+        return PillowMetrics(self._fonts)
+
+    def load_slide(self, path, width, height):
+        return np.memmap(path, dtype=np.uint8, mode="r", shape=(height, width, 4))
+
+
+SLIDE_RENDERERS = {
+    "wand": WandSlideRenderer,
+    "pillow": PillowSlideRenderer,
+}
+
+
+def create_renderer(name, **kwargs):
+    """Instantiate a slide renderer from SLIDE_RENDERERS by name."""
+    try:
+        renderer_class = SLIDE_RENDERERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown slide renderer '{name}'. Choose from: {', '.join(SLIDE_RENDERERS)}")
+    return renderer_class(**kwargs)
@@ -0,0 +1,131 @@
+import os
+import json
+from collections import namedtuple
+
+from render_cache import DiskCache
+from text_layout import font_extents, measure_text
+
+# Text elements in the order generate_slide_image() stacks them down a slide
+TEXT_KEYS = ("title", "subtitle", "content", "question", "options", "points", "explanation")
+DEFAULT_TITLE_POSITION = (100, 100)
+DEFAULT_CODE_POSITION = (100, 100)
+DEFAULT_CHART_POSITION = (400, 200)
+TITLE_GAP = 20  # Space between the title's fixed position and the first line drawn there
+
+# One text element of a slide type with every default resolved. font_path is absolute, or None
+# to keep the previous element's font. top is the y the title starts the slide's text at, else None.
+TextStyle = namedtuple("TextStyle", ["key", "font_path", "font_size", "color", "line_spacing", "alignment", "top"])
+# Everything generate_slide_image() reads for one slide type. code_position is None without a code
+# section and slide_width is only set with a formula one. digest hashes the template section.
+SlideStyle = namedtuple("SlideStyle", ["slide_type", "texts", "has_formula", "slide_width", "code_position", "chart_position", "digest"])
+# A compiled template: SlideStyle per slide type, the chart_style section and a digest of the whole file
+Template = namedtuple("Template", ["path", "styles", "chart_style", "digest"])
+
+
+def _position(value, where, default):
+    if value is None:
+        return default
+    if (not isinstance(value, (list, tuple)) or len(value) != 2
+            or not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value)):
+        raise ValueError(f"{where} must be an [x, y] pair of numbers, got {value!r}")
+    return tuple(value)
+
+
+def _number(value, where):
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or value <= 0:
+        raise ValueError(f"{where} must be a positive number, got {value!r}")
+    return value
+
+
+def _text_style(key, conf, where):
+    if not isinstance(conf, dict):
+        raise ValueError(f"{where} must be an object, got {type(conf).__name__}")
+    font_size = _number(conf.get("font_size", int(_number(conf.get("scale", 1.0), f"{where}.scale") * 30)), f"{where}.font_size")
+    line_spacing = _number(conf.get("line_spacing", font_size + 5), f"{where}.line_spacing")
+    color = conf.get("color", "#000000")
+    if not isinstance(color, str):
+        raise ValueError(f"{where}.color must be a colour string, got {color!r}")
+    alignment = conf.get("alignment", "left")
+    if alignment not in ("left", "center"):
+        raise ValueError(f"{where}.alignment must be 'left' or 'center', got {alignment!r}")
+    font_path = conf.get("font_path")
+    if font_path is not None:
+        # Resolved against the working directory, like ImageMagick does when drawing
+        font_path = os.path.abspath(font_path)
+        if not os.path.isfile(font_path):
+            raise ValueError(f"{where}.font_path {conf['font_path']!r} does not exist (resolved to {font_path})")
+    top = None
+    if key == "title":
+        top = _position(conf.get("position"), f"{where}.position", DEFAULT_TITLE_POSITION)[1] + TITLE_GAP
+    return TextStyle(key, font_path, font_size, color, line_spacing, alignment, top)
+
+
+def _subsection(section, key, where):
+    value = section.get(key, {})
+    if not isinstance(value, dict):
+        raise ValueError(f"{where}.{key} must be an object, got {type(value).__name__}")
+    return value
+
+
+def _slide_style(slide_type, section, where):
+    if not isinstance(section, dict):
+        raise ValueError(f"{where} must be an object, got {type(section).__name__}")
+    texts = tuple(_text_style(key, section[key], f"{where}.{key}") for key in TEXT_KEYS if key in section)
+    slide_width = None
+    if "formula" in section:
+        slide_size = section.get("slide_size")
+        if not isinstance(slide_size, (list, tuple)) or len(slide_size) != 2:
+            raise ValueError(f"{where}.slide_size must be a [width, height] pair to centre its formula, got {slide_size!r}")
+        slide_width = _number(slide_size[0], f"{where}.slide_size[0]")
+    code_position = None  # Code is only drawn on slide types with a code section
+    if "code" in section:
+        code_position = _position(_subsection(section, "code", where).get("position"), f"{where}.code.position", DEFAULT_CODE_POSITION)
+    chart_position = _position(_subsection(section, "chart", where).get("position"), f"{where}.chart.position", DEFAULT_CHART_POSITION)
+    return SlideStyle(slide_type, texts, "formula" in section, slide_width, code_position, chart_position,
+                      DiskCache.make_key(section))
+
+
+def compile_template(data, path="template"):
+    """
+    Validate a template (the parsed template3.json) and resolve it into immutable styles.
+    Raises ValueError naming the first malformed field, so a bad template stops a render
+    before any slide is drawn.
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"{path} must hold a JSON object of slide types")
+    if not isinstance(data.get("content_slide"), dict):
+        raise ValueError(f"{path} needs a content_slide section; other slide types fall back to it")
+    styles = {slide_type: _slide_style(slide_type, section, f"{path}: {slide_type}") for slide_type, section in data.items()}
+    chart_style = _subsection(data.get("chart_slide", {}), "chart_style", f"{path}: chart_slide")
+    return Template(path, styles, chart_style, DiskCache.make_key(data))
+
+
+def load_template(path):
+    """Read and compile the template at path."""
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{path} is not valid JSON: {e}")
+    return compile_template(data, path)
+
+
+def style_for(template, slide_type):
+    """The SlideStyle of slide_type, falling back to content_slide like the raw template lookup did."""
+    return template.styles.get(slide_type) or template.styles["content_slide"]
+
+
+def preload_fonts(template, draw):
+    """
+    Load every font and size the template uses into text_layout's metrics caches through draw
+    (a Wand Drawing or a renderer's metrics object), so no slide pays for the first query
+    against a face. Returns the number of (font, size) pairs.
+    """
+    fonts = {(text.font_path, text.font_size) for style in template.styles.values() for text in style.texts if text.font_path}
+    with draw:
+        for font_path, font_size in sorted(fonts):
+            draw.font = font_path
+            draw.font_size = font_size
+            font_extents(draw)
+            measure_text(draw, "x")
+    return len(fonts)
@@ -0,0 +1,69 @@
+import logging
+import threading
+from collections import OrderedDict
+
+# Slide "lexer" names to Pygments lexer classes in pygments.lexers, imported on first use.
+# "c" has always been highlighted as C#.
+LEXERS = {
+    "python": "PythonLexer",
+    "java": "JavaLexer",
+    "mathematics": "MathematicaLexer",
+    "cpp": "CppLexer",
+    "c": "CSharpLexer",
+    "html": "HtmlLexer",
+    "css": "CssLexer",
+    "javascript": "JavascriptLexer",
+    "json": "JsonLexer",
+    "yaml": "YamlLexer",
+    "bash": "BashLexer",
+    "perl": "PerlLexer",
+    "php": "PhpLexer",
+    "ruby": "RubyLexer",
+    "sql": "SqlLexer",
+}
+DEFAULT_LEXER = "bash"
+SNIPPET_STYLE = "monokai"
+MAX_CACHED_SNIPPETS = 256
+
+_lexers = {}
+_snippets = OrderedDict()  # (text, lexer, font_size, style) -> PNG bytes
+_lock = threading.Lock()
+
+
+def get_lexer(name):
+    """The shared lexer instance registered under name, falling back to DEFAULT_LEXER."""
+    if name not in LEXERS:
+        logging.warning(f"Unknown lexer '{name}', highlighting as {DEFAULT_LEXER}")
+        name = DEFAULT_LEXER
+    with _lock:
+        lexer = _lexers.get(name)
+        if lexer is None:
+            import pygments.lexers
+            lexer = _lexers[name] = getattr(pygments.lexers, LEXERS[name])()
+    return lexer
+
+
+def render_snippet(text, lexer, font_size, style=SNIPPET_STYLE):
+    """
+    Highlight text as a PNG image held in memory, rendered once per (text, lexer, font_size, style).
+    Returns the PNG bytes.
+    """
+    key = (text, lexer, font_size, style)
+    with _lock:
+        png = _snippets.get(key)
+        if png is not None:
+            _snippets.move_to_end(key)
+            return png
+
+    from pygments import highlight
+    from pygments.formatters import ImageFormatter
+
+    # ImageFormatter keeps the drawables of every format() call, so each render needs its own
+    formatter = ImageFormatter(style=style, image_pad=17, line_pad=10, font_size=font_size)
+    png = highlight(text, get_lexer(lexer), formatter)
+
+    with _lock:
+        _snippets[key] = png
+        while len(_snippets) > MAX_CACHED_SNIPPETS:
+            _snippets.popitem(last=False)
+    return png
@@ -0,0 +1,201 @@
+import os
+import glob
+import time
+import logging
+import subprocess
+from collections import namedtuple
+
+import numpy as np
+
+from events import emit
+
+STREAM_CODEC = "libx264"
+STREAM_PRESET = "medium"
+HLS_SEGMENT_SECONDS = 4
+# Segment container per export mode: MPEG-TS for classic HLS, fragmented MP4 for fMP4/CMAF players
+# and for the adaptive bitrate ladder
+STREAM_SEGMENT_TYPES = {"hls": "mpegts", "fmp4": "fmp4", "abr": "fmp4"}
+
+# One encoder output of the "abr" export. Bitrates are capped with a VBV buffer of twice the
+# rate so players can switch renditions on segment boundaries.
+Rendition = namedtuple("Rendition", ["name", "height", "video_kbps", "audio_kbps"])
+RENDITIONS = {
+    "1080p": Rendition("1080p", 1080, 3000, 128),
+    "720p": Rendition("720p", 720, 1500, 96),
+    "480p": Rendition("480p", 480, 700, 64),
+}
+DEFAULT_RENDITIONS = ["1080p", "720p", "480p"]
+
+
+class StreamedClips:
+    """
+    Slide clips built from prepared slides as an in-order iterator produces them.
+    Asking for slide i blocks until every slide up to i has been prepared, so frames can be
+    encoded while later slides are still rendering.
+    """
+
+    def __init__(self, prepared_slides, build_clip, slides, template):
+        self._prepared_slides = iter(prepared_slides)
+        self._build_clip = build_clip
+        self._slides = slides
+        self._template = template
+        self._clips = []
+
+    def __len__(self):
+        return len(self._slides)
+
+    def __getitem__(self, index):
+        while len(self._clips) <= index:
+            prepared = next(self._prepared_slides)
+            i = len(self._clips)
+            self._clips.append(self._build_clip(self._slides[i], self._template, prepared))
+        return self._clips[index]
+
+    def finish(self):
+        """Drain the iterator so any remaining slides are prepared and recorded."""
+        for _prepared in self._prepared_slides:
+            pass
+
+
+def playlist_path_for(output_path):
+    """The HLS playlist written next to output_path."""
+    return os.path.splitext(output_path)[0] + ".m3u8"
+
+
+def ladder_for(names, source_height):
+    """The renditions named in names, tallest first, skipping any taller than the source frames."""
+    try:
+        ladder = [RENDITIONS[name] for name in names]
+    except KeyError as e:
+        raise ValueError(f"Unknown rendition {e}. Choose from: {', '.join(RENDITIONS)}")
+    ladder = sorted((r for r in ladder if r.height <= source_height), key=lambda r: -r.height)
+    if not ladder:
+        raise ValueError(f"No rendition in {names} fits {source_height}p slides")
+    return ladder
+
+
+def _ladder_arguments(ladder, has_audio, base, playlist_path):
+    """
+    ffmpeg arguments that split the one decoded input into every rendition of ladder and write
+    each as its own HLS variant, with playlist_path as the master playlist listing them all.
+    """
+    split = f"[0:v]split={len(ladder)}" + "".join(f"[in{i}]" for i in range(len(ladder)))
+    scales = [f"[in{i}]scale=-2:{r.height}:flags=lanczos[out{i}]" for i, r in enumerate(ladder)]
+    arguments = ["-filter_complex", ";".join([split] + scales)]
+    stream_map = []
+    for i, r in enumerate(ladder):
+        arguments += ["-map", f"[out{i}]", f"-b:v:{i}", f"{r.video_kbps}k", f"-maxrate:v:{i}", f"{r.video_kbps}k",
+                      f"-bufsize:v:{i}", f"{2 * r.video_kbps}k"]
+        if has_audio:
+            arguments += ["-map", "1:a", f"-b:a:{i}", f"{r.audio_kbps}k"]
+            stream_map.append(f"v:{i},a:{i},name:{r.name}")
+        else:
+            stream_map.append(f"v:{i},name:{r.name}")
+    if has_audio:
+        arguments += ["-c:a", "aac"]
+    arguments += [
+        "-c:v", STREAM_CODEC, "-preset", STREAM_PRESET, "-pix_fmt", "yuv420p",
+        "-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+        "-f", "hls", "-hls_time", str(HLS_SEGMENT_SECONDS), "-hls_playlist_type", "event",
+        "-hls_flags", "independent_segments+temp_file", "-hls_segment_type", "fmp4",
+        "-hls_segment_filename", f"{base}_%v_%05d.m4s",
+        "-hls_fmp4_init_filename", f"{os.path.basename(base)}_%v_init.mp4",
+        "-master_pl_name", os.path.basename(playlist_path),
+        "-var_stream_map", " ".join(stream_map),
+        f"{base}_%v.m3u8",
+    ]
+    return arguments
+
+
+def export_stream(timeline, audio, output_path, fps, export_mode="hls", work_dir=None, renditions=DEFAULT_RENDITIONS):
+    """
+    Encode the timeline in frame order into a growing HLS playlist next to output_path.
+    ffmpeg publishes a segment to the playlist every HLS_SEGMENT_SECONDS, so playback can start
+    while later slides are still being rendered. Once the course is complete the segments are
+    stream-copied into output_path as a regular MP4.
+    export_mode "abr" renders every frame once and has the same ffmpeg process scale and encode
+    it for each of renditions, writing one variant playlist per rendition and a master playlist
+    players pick between; output_path then gets the tallest rendition.
+    audio is an AudioClip, the path of a ready voiceover WAV, or None.
+    Returns the playlist path (the master playlist for "abr").
+    """
+    from moviepy.config import get_setting  # Loads imageio's ffmpeg lookup, so only once a stream is written
+
+    ffmpeg = get_setting("FFMPEG_BINARY")
+    started = time.time()
+    playlist_path = playlist_path_for(output_path)
+    base = os.path.splitext(playlist_path)[0]
+    segment_type = STREAM_SEGMENT_TYPES[export_mode]
+    extension = "m4s" if segment_type == "fmp4" else "ts"
+    for stale in (glob.glob(f"{glob.escape(base)}_*.ts") + glob.glob(f"{glob.escape(base)}_*.m4s") +
+                  glob.glob(f"{glob.escape(base)}_*init.mp4") + glob.glob(f"{glob.escape(base)}_*.m3u8")):
+        os.remove(stale)
+
+    width, height = timeline.size
+    command = [
+        ffmpeg, "-y", "-v", "error",
+        "-f", "rawvideo", "-vcodec", "rawvideo", "-s", f"{width}x{height}", "-pix_fmt", "rgb24",
+        "-r", f"{fps:.02f}", "-i", "-",
+    ]
+    if isinstance(audio, str):
+        command += ["-i", audio]  # A voiceover WAV that is already assembled
+    elif audio is not None:
+        # The voiceover only depends on the synthesized audio, so it is written in full up front
+        audio_path = os.path.join(work_dir or os.path.dirname(playlist_path), "voiceover.wav")
+        audio.write_audiofile(audio_path, fps=44100, nbytes=2, codec="pcm_s16le", logger=None)
+        command += ["-i", audio_path]
+
+    if export_mode == "abr":
+        ladder = ladder_for(renditions, height)
+        command += _ladder_arguments(ladder, audio is not None, base, playlist_path)
+        # ffmpeg names each variant playlist after its var_stream_map name
+        remux_source = f"{base}_{ladder[0].name}.m3u8"
+        description = f"{', '.join(r.name for r in ladder)} renditions"
+    else:
+        if audio is not None:
+            command += ["-map", "0:v", "-map", "1:a", "-c:a", "aac"]
+        command += [
+            "-c:v", STREAM_CODEC, "-preset", STREAM_PRESET, "-pix_fmt", "yuv420p",
+            "-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+            "-f", "hls", "-hls_time", str(HLS_SEGMENT_SECONDS), "-hls_playlist_type", "event",
+            "-hls_flags", "independent_segments+temp_file", "-hls_segment_type", segment_type,
+            "-hls_segment_filename", f"{base}_%05d.{extension}",
+        ]
+        if segment_type == "fmp4":
+            command += ["-hls_fmp4_init_filename", f"{os.path.basename(base)}_init.mp4"]
+        command.append(playlist_path)
+        remux_source = playlist_path
+        description = f"{export_mode} segments"
+
+    logging.info(f"Streaming course to {playlist_path} ({description} every {HLS_SEGMENT_SECONDS}s)...")
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    current_slide = None
+    last_frame = data = None
+    try:
+        for t, frame in timeline.frames(np.arange(0, timeline.duration, 1.0 / fps)):
+            segment = timeline.segments[timeline.segment_at(t)]
+            if segment.slide != current_slide:
+                current_slide = segment.slide
+                logging.info(f"Streaming slide {current_slide + 1} at {t:.1f}s ({time.time() - started:.1f}s elapsed)")
+                emit("progress", stage="encode", slide=current_slide + 1, done=round(float(t), 2), total=round(timeline.duration, 2))
+            if frame is not last_frame:
+                last_frame, data = frame, frame.tobytes()
+            try:
+                process.stdin.write(data)
+            except BrokenPipeError:
+                break  # ffmpeg exited early; its error is reported below
+    finally:
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        stderr = process.stderr.read().decode("utf-8", "replace")
+        process.wait()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed while streaming {playlist_path}: {stderr}")
+
+    # Keep producing the single MP4 callers of this script read back
+    subprocess.run([ffmpeg, "-y", "-v", "error", "-i", remux_source, "-c", "copy", output_path],
+                   check=True, capture_output=True, text=True)
+    logging.info(f"Streamed {playlist_path} and wrote {output_path} in {time.time() - started:.1f}s")
+    return playlist_path
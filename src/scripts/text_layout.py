@@ -0,0 +1,85 @@
+MAX_CACHED_STRINGS = 50000
+
+_surface = None
+_widths = {}  # (engine, font, font_size) -> {text: width}
+_extents = {}  # (engine, font, font_size) -> (ascender, descender)
+
+
+def _measuring_surface():
+    """The single 1x1 image all ImageMagick metrics queries run against."""
+    global _surface
+    if _surface is None:
+        from wand.image import Image as WandImage
+
+        _surface = WandImage(width=1, height=1)
+    return _surface
+
+
+def _engine(draw):
+    # Drawings from other rasterizers than ImageMagick name their engine, as their metrics differ
+    return getattr(draw, "engine", "wand")
+
+
+def _font_key(draw):
+    return (_engine(draw), draw.font, float(draw.font_size))
+
+
+def _font_cache(draw):
+    key = _font_key(draw)
+    cache = _widths.get(key)
+    if cache is None or len(cache) > MAX_CACHED_STRINGS:
+        cache = _widths[key] = {}
+    return cache
+
+
+def measure_text(draw, text):
+    """Width of text in the draw's current font and size, measured once per (font, size, text)."""
+    cache = _font_cache(draw)
+    width = cache.get(text)
+    if width is None:
+        if _engine(draw) == "wand":
+            width = draw.get_font_metrics(_measuring_surface(), text).text_width
+        else:
+            width = draw.text_width(text)  # Other engines measure with their own fonts
+        cache[text] = width
+    return width
+
+
+def font_extents(draw):
+    """(ascender, descender) of the draw's current font in pixels, both positive."""
+    key = _font_key(draw)
+    extents = _extents.get(key)
+    if extents is None:
+        if _engine(draw) == "wand":
+            metrics = draw.get_font_metrics(_measuring_surface(), "Hg")
+            extents = (metrics.ascender, -metrics.descender)
+        else:
+            extents = draw.extents()
+        _extents[key] = extents
+    return extents
+
+
+def wrap_text(draw, text, max_width, line_spacing):
+    """
+    Greedy word wrap with the same line breaks as measuring every candidate line, because it
+    does: summed word widths drift from the real width by kerning and rounding, so each
+    candidate is measured whole. Widths are cached, so wrapping text again costs no queries.
+    """
+    lines = []
+    current_line = ""
+    total_height = 0
+
+    for word in text.split():
+        test_line = f"{current_line} {word}" if current_line else word
+        if measure_text(draw, test_line) <= max_width:
+            current_line = test_line
+        else:
+            lines.append(current_line)
+            current_line = word
+            total_height += line_spacing  # Increase height when new line is added
+
+    if current_line:
+        lines.append(current_line)
+        total_height += line_spacing
+
+    return lines, total_height
@@ -0,0 +1,361 @@
+import bisect
+from collections import namedtuple
+
+import numpy as np
+import proglog
+from moviepy.video.VideoClip import VideoClip, ImageClip
+from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+from moviepy.audio.AudioClip import AudioClip
+from moviepy.video.fx.fadein import fadein
+from moviepy.video.fx.fadeout import fadeout
+
+from assets import plate_array
+
+# One entry of the flat timeline. kind is "slide" for the body of slide `slide`, or
+# "transition" for a slide-out window after it moving in `direction`. start/end are absolute seconds.
+Segment = namedtuple("Segment", ["start", "end", "kind", "slide", "direction", "fade_in", "fade_out"])
+
+SLIDE_DIRECTIONS = {
+    "slide_left": "left",
+    "slide_right": "right",
+    "slide_up": "top",
+    "slide_down": "bottom",
+}
+
+
+def build_timeline(durations, transitions, slide_types, transition_duration):
+    """
+    Lay slides and the transitions between them out on a single flat, sorted list of segments.
+    transitions[i] is the transition from slide i to slide i + 1. Consecutive unordered_list_slide
+    slides are joined with a plain cut, as before.
+    """
+    count = len(durations)
+    fade_in = [0] * count
+    fade_out = [0] * count
+    windows = [None] * count
+
+    for i in range(count - 1):
+        if slide_types[i] == "unordered_list_slide" and slide_types[i + 1] == "unordered_list_slide":
+            continue
+        transition_type = transitions[i]
+        if transition_type in SLIDE_DIRECTIONS:
+            windows[i] = SLIDE_DIRECTIONS[transition_type]
+        elif transition_type == "fade_in":
+            fade_in[i + 1] = transition_duration
+        elif transition_type == "fade_out":
+            fade_out[i] = transition_duration
+        elif transition_type == "dissolve":
+            fade_out[i] = transition_duration
+            fade_in[i + 1] = transition_duration
+
+    # Sum the total from the back like the old pairwise concatenation did, so float rounding
+    # (and therefore the number of frames written) matches it exactly
+    total = 0
+    for i in range(count - 1, -1, -1):
+        total = (durations[i] + transition_duration if windows[i] else durations[i]) + total
+
+    segments = []
+    t = 0
+    for i, duration in enumerate(durations):
+        segments.append(Segment(t, t + duration, "slide", i, None, fade_in[i], fade_out[i]))
+        t += duration
+        if windows[i]:
+            segments.append(Segment(t, t + transition_duration, "transition", i, windows[i], 0, 0))
+            t += transition_duration
+    segments[-1] = segments[-1]._replace(end=total)
+    return segments
+
+
+def flatten(clip):
+    """
+    Render a clip whose layers never move or change into a plain ImageClip once, keeping its
+    mask and audio. Its frames are then the same array every time instead of every layer being
+    blended again for every output frame.
+    """
+    still = ImageClip(clip.get_frame(0)).set_duration(clip.duration)
+    if clip.mask is not None:
+        still = still.set_mask(ImageClip(clip.mask.get_frame(0), ismask=True).set_duration(clip.duration))
+    return still.set_audio(clip.audio)
+
+
+def slide_window(clip, background, direction, duration):
+    """The transition window after a slide: the slide moves out over the background plate."""
+    w, h = clip.size
+    # Horizontal moves step by h and vertical ones by w, matching the original slide_transition()
+    if direction == "top":
+        clip = clip.set_position(lambda t: ('center', -w * t / duration))
+    elif direction == "bottom":
+        clip = clip.set_position(lambda t: ('center', w * t / duration))
+    elif direction == "left":
+        clip = clip.set_position(lambda t: (-h * t / duration, 'center'))
+    elif direction == "right":
+        clip = clip.set_position(lambda t: (h * t / duration, 'center'))
+    return CompositeVideoClip([background, clip]).set_duration(duration).without_audio()
+
+
+def is_still(clip):
+    """True when every frame of clip is its one image array, as for a plain (or flattened) ImageClip."""
+    # A plain ImageClip hands back its one image for every t; effects wrap make_frame
+    return clip.make_frame(0) is getattr(clip, "img", None)
+
+
+class StillSlideWindow:
+    """
+    slide_window() for a still slide, rendered with array slicing instead of compositing.
+    Each frame is the plate with the slide pasted at the same integer offset moviepy would blit
+    it at, so the output is identical. The mask terms that do not depend on t are computed once
+    for the window, and an opaque slide is pasted without any blending at all.
+    """
+
+    def __init__(self, clip, plate, direction, duration):
+        # Contiguous copies: the RGB of an RGBA still is a strided view, which copies several times slower
+        self.image = np.ascontiguousarray(clip.img)
+        self.plate = plate
+        self.direction = direction
+        self.duration = duration
+        self.clip_duration = clip.duration
+        self._weighted = None
+        self._inverse = None
+        mask = clip.mask.img if clip.mask is not None else None
+        if mask is not None and mask.min() < 1.0:
+            mask = np.dstack(3 * [mask])
+            self._weighted = 1.0 * mask * self.image
+            self._inverse = 1.0 - mask
+
+    def position(self, t):
+        """Top-left corner of the slide at time t, truncated to pixels like moviepy's blit_on()."""
+        hf, wf = self.plate.shape[:2]
+        hi, wi = self.image.shape[:2]
+        # Horizontal moves step by the height and vertical ones by the width, as in slide_window()
+        if self.direction == "top":
+            x, y = (wf - wi) / 2, -wi * t / self.duration
+        elif self.direction == "bottom":
+            x, y = (wf - wi) / 2, wi * t / self.duration
+        elif self.direction == "left":
+            x, y = -hi * t / self.duration, (hf - hi) / 2
+        else:
+            x, y = hi * t / self.duration, (hf - hi) / 2
+        return int(x), int(y)
+
+    def get_frame(self, t):
+        plate = self.plate
+        if t >= self.clip_duration:
+            return plate.copy()  # The slide has ended before its window did; only the plate shows
+        xp, yp = self.position(t)
+        hi, wi = self.image.shape[:2]
+        hf, wf = plate.shape[:2]
+        # Source (x1:x2, y1:y2) and destination (xp1:xp2, yp1:yp2) of the visible part
+        x1, y1 = max(0, -xp), max(0, -yp)
+        x2, y2 = min(wi, wf - xp), min(hi, hf - yp)
+        xp1, yp1 = max(0, xp), max(0, yp)
+        xp2, yp2 = min(wf, xp + wi), min(hf, yp + hi)
+        if xp1 >= xp2 or yp1 >= yp2:
+            return plate.copy()
+        if self._inverse is not None:
+            frame = plate.copy()
+            frame[yp1:yp2, xp1:xp2] = self._weighted[y1:y2, x1:x2] + self._inverse[y1:y2, x1:x2] * frame[yp1:yp2, xp1:xp2]
+            return frame
+        # Opaque: only the strips of plate around the slide are copied
+        frame = np.empty_like(plate)
+        frame[:yp1] = plate[:yp1]
+        frame[yp2:] = plate[yp2:]
+        frame[yp1:yp2, :xp1] = plate[yp1:yp2, :xp1]
+        frame[yp1:yp2, xp2:] = plate[yp1:yp2, xp2:]
+        frame[yp1:yp2, xp1:xp2] = self.image[y1:y2, x1:x2]
+        return frame
+
+
+class StillFade:
+    """
+    fadein(fadeout(clip)) for a still slide. Both fades scale every pixel by a factor that only
+    depends on t, so each frame is a single lookup of the image through a 256-entry table that
+    applies the same float arithmetic, instead of two full-frame float multiplies and a cast.
+    """
+
+    def __init__(self, clip, fade_in, fade_out):
+        self.image = clip.img
+        self._contiguous = np.ascontiguousarray(clip.img)
+        self.duration = clip.duration
+        self.fade_in = fade_in
+        self.fade_out = fade_out
+        self._levels = np.arange(256.0)
+
+    def get_frame(self, t):
+        fading_out = self.fade_out and (self.duration - t) < self.fade_out
+        fading_in = self.fade_in and t < self.fade_in
+        if not (fading_out or fading_in):
+            return self.image
+        levels = self._levels
+        if fading_out:
+            fading = 1.0 * (self.duration - t) / self.fade_out
+            levels = fading * levels + (1 - fading) * 0.0
+        if fading_in:
+            fading = 1.0 * t / self.fade_in
+            levels = fading * levels + (1 - fading) * 0.0
+        return levels.astype("uint8")[self._contiguous]
+
+
+class TimelineAudioClip(AudioClip):
+    """
+    Voiceover track of a timeline: each slide's audio placed at its body's absolute start.
+    audio_clips[i] is slide i's audio clip, or None for a silent slide.
+    """
+
+    def __init__(self, segments, audio_clips):
+        self._tracks = [(segment.start, audio_clips[segment.slide]) for segment in segments
+                        if segment.kind == "slide" and audio_clips[segment.slide] is not None]
+        self._starts = [start for start, _audio in self._tracks]
+        self._channels = max((audio.nchannels for _start, audio in self._tracks), default=2)
+        # Like CompositeAudioClip, the track ends when the last voiceover does
+        duration = max((start + audio.duration for start, audio in self._tracks), default=0)
+        AudioClip.__init__(self, make_frame=self._make_frame, duration=duration)
+        self.fps = max((audio.fps for _start, audio in self._tracks if getattr(audio, "fps", None)), default=44100)
+
+    def _make_frame(self, t):
+        times = np.atleast_1d(np.asarray(t, dtype=float))
+        sound = np.zeros((len(times), self._channels))
+        first = max(bisect.bisect_right(self._starts, times.min()) - 1, 0)
+        last = bisect.bisect_right(self._starts, times.max())
+        for start, audio in self._tracks[first:last]:
+            playing = (times >= start) & (times < start + audio.duration)
+            if playing.any():
+                sound[playing] += audio.get_frame(times[playing] - start)
+        return sound if isinstance(t, np.ndarray) else sound[0]
+
+
+class TimelineClip(VideoClip):
+    """
+    Flat compositor over a build_timeline() segment list.
+    Each frame is resolved with one bisect over segment start times, so lookup cost does not
+    grow with the number of slides the way nested concatenate_videoclips chains do.
+    With cuts, fades are skipped and a transition window holds its slide, keeping the timing
+    of the full render while every frame stays a still (used for drafts).
+    """
+
+    def __init__(self, segments, clips, background_path, with_audio=True, vectorized=True, cuts=False):
+        self.segments = segments
+        self.vectorized = vectorized
+        self.cuts = cuts
+        self._starts = [segment.start for segment in segments]
+        self.clips = clips
+        self._background_path = background_path
+        self._backgrounds = {}  # size -> transition plate ImageClip
+        self._segment_clips = {}
+        self._still_slides = {}
+        self._still_window = (None, None)
+        VideoClip.__init__(self, make_frame=self._make_frame, duration=segments[-1].end)
+        if with_audio:
+            self.audio = TimelineAudioClip(segments, [clip.audio for clip in clips])
+
+    def still_key(self, t):
+        """
+        A key identifying the frame at time t when it is a still, or None when it has to be
+        composited. Two times with the same key show the same frame, so exporters can reuse the
+        previous frame's bytes instead of rendering it again. Only the body of a slide whose
+        clip is a single image, outside its fade windows, is still; transitions never are
+        unless they are cuts.
+        """
+        index = self.segment_at(t)
+        segment = self.segments[index]
+        if segment.kind != "slide" and not self.cuts:
+            return None
+        if not self.is_still_slide(segment.slide):
+            return None
+        if self.cuts:
+            # A held transition window shows the same frame as the slide body right before it
+            return index - 1 if segment.kind == "transition" else index
+        clip = self.clips[segment.slide]
+        local = t - self._starts[index]
+        if local < segment.fade_in or clip.duration - local < segment.fade_out:
+            return None
+        return index
+
+    def frames(self, times):
+        """
+        Yield (t, uint8 frame) for each time. Consecutive times on the same still get the very
+        same array, so writers can tell a repeated frame with `is` and skip converting it again.
+        """
+        last_key = None
+        frame = None
+        for t in times:
+            key = self.still_key(t)
+            if key is None or key != last_key:
+                frame = self.get_frame(t)
+                if frame.dtype != "uint8":
+                    frame = frame.astype("uint8")
+            last_key = key
+            yield t, frame
+
+    def iter_frames(self, fps=None, with_times=False, logger=None, dtype=None):
+        """VideoClip.iter_frames() on top of frames(), so write_videofile() skips repeated stills too."""
+        times = proglog.default_bar_logger(logger).iter_bar(t=np.arange(0, self.duration, 1.0 / fps))
+        for t, frame in self.frames(times):
+            yield (t, frame) if with_times else frame
+
+    def is_still_slide(self, slide):
+        if slide not in self._still_slides:
+            self._still_slides[slide] = is_still(self.clips[slide])
+        return self._still_slides[slide]
+
+    def segment_at(self, t):
+        """Index of the segment playing at time t."""
+        index = bisect.bisect_right(self._starts, t) - 1
+        return min(max(index, 0), len(self.segments) - 1)
+
+    def background(self, size, duration):
+        """The transition plate at size=(w, h) as a clip of duration; every call shares the pixels of one size."""
+        size = tuple(size)
+        plate = self._backgrounds.get(size)
+        if plate is None:
+            plate = self._backgrounds[size] = ImageClip(np.ascontiguousarray(plate_array(self._background_path, size)))
+        return plate.set_duration(duration)
+
+    def still_segment(self, index):
+        """
+        The array renderer for a transition or fading segment of a still slide, or None when the
+        segment needs the moviepy clip. Only the current one is kept: a window's precomputed
+        mask terms are several full-size float arrays, and frames are rendered in time order.
+        """
+        segment = self.segments[index]
+        if not self.vectorized or not self.is_still_slide(segment.slide):
+            return None
+        if segment.kind != "transition" and not (segment.fade_in or segment.fade_out):
+            return None
+        current_index, renderer = self._still_window
+        if current_index == index:
+            return renderer
+        clip = self.clips[segment.slide]
+        if segment.kind == "transition":
+            if clip.mask is not None and not is_still(clip.mask):
+                return None
+            plate = self.background(clip.size, segment.end - segment.start).img
+            renderer = StillSlideWindow(clip, plate, segment.direction, segment.end - segment.start)
+        else:
+            renderer = StillFade(clip, segment.fade_in, segment.fade_out)
+        self._still_window = (index, renderer)
+        return renderer
+
+    def segment_clip(self, index):
+        """The clip rendering one segment in its own local time, built on first use."""
+        if self.cuts:
+            return self.clips[self.segments[index].slide]
+        renderer = self.still_segment(index)
+        if renderer is not None:
+            return renderer
+        if index not in self._segment_clips:
+            segment = self.segments[index]
+            clip = self.clips[segment.slide]
+            if segment.kind == "transition":
+                background = self.background(clip.size, segment.end - segment.start)
+                clip = slide_window(clip, background, segment.direction, segment.end - segment.start)
+            else:
+                if segment.fade_out:
+                    clip = fadeout(clip, segment.fade_out)
+                if segment.fade_in:
+                    clip = fadein(clip, segment.fade_in)
+            self._segment_clips[index] = clip
+        return self._segment_clips[index]
+
+    def _make_frame(self, t):
+        index = self.segment_at(t)
+        return self.segment_clip(index).get_frame(t - self._starts[index])
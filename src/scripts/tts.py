@@ -0,0 +1,349 @@
+import io
+import os
+import time
+import wave
+import queue
+import tempfile
+import threading
+import shutil
+import asyncio
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape
+
+from render_cache import DiskCache
+
+COURSE_MAX_CHARS = 6000  # Voiceover text per whole-course request, well inside Azure's 10 minutes of audio
+
+
+class TTSError(Exception):
+    """Raised when a backend could not synthesize a piece of text."""
+
+
+class TTSBackend:
+    """
+    Interface for text-to-speech engines.
+    synthesize() is blocking and writes a WAV file; the pipeline below runs it on worker threads.
+    """
+    name = "base"
+
+    def cache_identity(self):
+        """Everything besides the text that changes the produced audio, used in the cache key."""
+        raise NotImplementedError
+
+    def synthesize(self, text, filename):
+        raise NotImplementedError
+
+    def synthesize_segments(self, texts):
+        """
+        Synthesize consecutive texts as one piece of speech and split it back up.
+        Returns (wave params, [PCM bytes per text]). This default synthesizes each text on its
+        own; backends that can report offsets inside one request override it.
+        """
+        pieces = []
+        params = None
+        with tempfile.TemporaryDirectory(prefix="tts-") as work_dir:
+            for i, text in enumerate(texts):
+                path = os.path.join(work_dir, f"{i}.wav")
+                self.synthesize(text, path)
+                piece_params, frames = read_wav(path)
+                if params is not None and piece_params != params:
+                    raise TTSError(f"{self.name} produced mixed audio formats: {params} and {piece_params}")
+                params = piece_params
+                pieces.append(frames)
+        return params, pieces
+
+    def close(self):
+        pass
+
+
+class AzureTTSBackend(TTSBackend):
+    """Azure Speech backend that keeps a pool of connected synthesizers for reuse across requests."""
+    name = "azure"
+
+    def __init__(self, speech_key, speech_region, language, voice, output_format, pool_size=4):
+        import azure.cognitiveservices.speech as speechsdk
+        self._speechsdk = speechsdk
+        self.language = language
+        self.voice = voice
+        self.output_format = output_format
+
+        self.speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=speech_region)
+        self.speech_config.speech_synthesis_language = language
+        self.speech_config.speech_synthesis_voice_name = voice
+        self.speech_config.set_speech_synthesis_output_format(getattr(speechsdk.SpeechSynthesisOutputFormat, output_format))
+        logging.info(f"Azure Speech configured for region: {speech_region}, language: {language}, voice: {voice}")
+
+        self._pool_size = pool_size
+        self._created = 0
+        self._lock = threading.Lock()
+        self._synthesizers = queue.Queue()
+        self._connections = []  # One per pooled synthesizer; dropping it would let the pre-connect be closed
+
+    def cache_identity(self):
+        return (self.voice, self.language, self.output_format)
+
+    def _acquire(self):
+        try:
+            return self._synthesizers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self._pool_size
+            if create:
+                self._created += 1
+        if create:
+            # audio_config=None keeps the audio in memory so one synthesizer can serve many files
+            synthesizer = self._speechsdk.SpeechSynthesizer(speech_config=self.speech_config, audio_config=None)
+            connection = self._speechsdk.Connection.from_speech_synthesizer(synthesizer)
+            connection.open(True)  # Pre-connect so the first request does not pay the handshake
+            with self._lock:
+                self._connections.append(connection)
+            return synthesizer
+        return self._synthesizers.get()
+
+    def synthesize(self, text, filename):
+        synthesizer = self._acquire()
+        try:
+            result = synthesizer.speak_text_async(text).get()
+        finally:
+            self._synthesizers.put(synthesizer)
+
+        self._check(result)
+        with open(filename, "wb") as f:
+            f.write(result.audio_data)
+
+    def _check(self, result):
+        if result.reason != self._speechsdk.ResultReason.SynthesizingAudioCompleted:
+            details = getattr(result, "cancellation_details", None)
+            reason = details.error_details if details else result.reason
+            raise TTSError(f"Azure TTS failed: {reason}")
+
+    def synthesize_segments(self, texts):
+        """
+        Speak all texts in one SSML request with a bookmark before each, and cut the returned
+        PCM at the audio offsets the bookmark events report.
+        """
+        if not self.output_format.startswith("Riff"):
+            raise TTSError(f"Whole-course synthesis needs a Riff PCM output format, not {self.output_format}")
+        body = "".join(f'<bookmark mark="{i}"/>{escape(text)} ' for i, text in enumerate(texts))
+        ssml = (f'<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xml:lang="{self.language}">'
+                f'<voice name="{self.voice}">{body}</voice></speak>')
+
+        offsets = {}  # bookmark -> offset in 100 ns ticks
+
+        def bookmark_reached(evt):
+            offsets[int(evt.text)] = evt.audio_offset
+
+        synthesizer = self._acquire()
+        synthesizer.bookmark_reached.connect(bookmark_reached)
+        try:
+            result = synthesizer.speak_ssml_async(ssml).get()
+        finally:
+            synthesizer.bookmark_reached.disconnect_all()
+            self._synthesizers.put(synthesizer)
+        self._check(result)
+
+        params, frames = read_wav(io.BytesIO(result.audio_data))
+        if len(offsets) != len(texts):
+            raise TTSError(f"Azure TTS reported {len(offsets)} of {len(texts)} bookmarks")
+        frame_size = params[0] * params[1]
+        # Anything before the first bookmark (leading silence) belongs to the first text
+        bounds = [0] + [round(offsets[i] * params[2] / 10_000_000) * frame_size for i in range(1, len(texts))] + [len(frames)]
+        return params, [frames[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+class SilenceTTSBackend(TTSBackend):
+    """Writes silence as long as the text would take to speak, so timing can be checked without Azure."""
+    name = "silence"
+
+    def __init__(self, words_per_minute=150, sample_rate=24000):
+        self.words_per_minute = words_per_minute
+        self.sample_rate = sample_rate
+
+    def cache_identity(self):
+        return (self.name, self.words_per_minute, self.sample_rate)
+
+    def synthesize(self, text, filename):
+        words = max(1, len(text.split()))
+        frames = int(self.sample_rate * words * 60 / self.words_per_minute)
+        with wave.open(filename, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(b"\0\0" * frames)
+
+
+class EspeakTTSBackend(TTSBackend):
+    """Offline backend driving a local espeak-ng/espeak binary."""
+    name = "espeak"
+
+    def __init__(self, voice="en", words_per_minute=160):
+        self.binary = shutil.which("espeak-ng") or shutil.which("espeak")
+        if not self.binary:
+            raise TTSError("espeak backend selected but neither espeak-ng nor espeak is installed.")
+        self.voice = voice
+        self.words_per_minute = words_per_minute
+
+    def cache_identity(self):
+        return (self.name, self.voice, self.words_per_minute)
+
+    def synthesize(self, text, filename):
+        command = [self.binary, "-v", self.voice, "-s", str(self.words_per_minute), "-w", filename, text]
+        try:
+            subprocess.run(command, check=True, capture_output=True, text=True)
+        except subprocess.CalledProcessError as e:
+            raise TTSError(f"espeak failed: {e.stderr}")
+
+
+def read_wav(source):
+    """(nchannels, sampwidth, framerate) and the PCM frames of a WAV file path or file object."""
+    with wave.open(source, "rb") as wav:
+        return (wav.getnchannels(), wav.getsampwidth(), wav.getframerate()), wav.readframes(wav.getnframes())
+
+
+def write_wav(path, params, frames):
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(params[0])
+        wav.setsampwidth(params[1])
+        wav.setframerate(params[2])
+        wav.writeframes(frames)
+
+
+def wav_duration(path):
+    """Length of a WAV file in seconds, read from its header."""
+    with wave.open(path, "rb") as wav:
+        return wav.getnframes() / wav.getframerate()
+
+
+def assemble_track(placements, duration, path):
+    """
+    Write one WAV of duration seconds with each (start_seconds, wav_path) placed at its start,
+    copying PCM frames instead of decoding and mixing audio clips. Silence fills the gaps.
+    """
+    params = None
+    track = None
+    for start, wav_path in placements:
+        piece_params, frames = read_wav(wav_path)
+        if track is None:
+            params = piece_params
+            track = bytearray(round(duration * params[2]) * params[0] * params[1])
+        elif piece_params != params:
+            raise TTSError(f"Cannot assemble {wav_path}: {piece_params} does not match {params}")
+        offset = round(start * params[2]) * params[0] * params[1]
+        frames = frames[:max(0, len(track) - offset)]
+        track[offset:offset + len(frames)] = frames
+    if track is None:
+        raise TTSError("No voiceover to assemble")
+    write_wav(path, params, bytes(track))
+
+
+def _chunk_texts(texts, max_chars):
+    """Split texts into runs of consecutive texts of at most max_chars characters each."""
+    chunks = [[]]
+    size = 0
+    for text in texts:
+        if chunks[-1] and size + len(text) > max_chars:
+            chunks.append([])
+            size = 0
+        chunks[-1].append(text)
+        size += len(text)
+    return chunks
+
+
+def synthesize_course(texts, backend, max_chars=COURSE_MAX_CHARS, max_in_flight=8, retries=3, backoff=0.5):
+    """
+    Synthesize many consecutive texts as a few long requests instead of one per text.
+    Texts are grouped into requests of up to max_chars characters that run concurrently, and
+    each request is split back into one PCM piece per text.
+    Returns (wave params, [PCM bytes per text]).
+    """
+    if not texts:
+        return None, []
+
+    def run(chunk):
+        for attempt in range(retries + 1):
+            try:
+                return backend.synthesize_segments(chunk)
+            except Exception as e:
+                if attempt == retries:
+                    raise
+                delay = backoff * (2 ** attempt)
+                logging.warning(f"Course TTS attempt {attempt + 1} for {len(chunk)} texts failed ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    chunks = _chunk_texts(texts, max_chars)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_in_flight, len(chunks)))) as executor:
+        results = list(executor.map(run, chunks))
+    params = results[0][0]
+    pieces = []
+    for chunk_params, chunk_pieces in results:
+        if chunk_params != params:
+            raise TTSError(f"{backend.name} produced mixed audio formats: {params} and {chunk_params}")
+        pieces.extend(chunk_pieces)
+    return params, pieces
+
+
+async def _synthesize_job(backend, executor, semaphore, text, filename, retries, backoff):
+    loop = asyncio.get_running_loop()
+    async with semaphore:
+        for attempt in range(retries + 1):
+            try:
+                await loop.run_in_executor(executor, backend.synthesize, text, filename)
+                return
+            except Exception as e:
+                if attempt == retries:
+                    raise
+                delay = backoff * (2 ** attempt)
+                logging.warning(f"TTS attempt {attempt + 1} for {filename} failed ({e}); retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+
+async def _synthesize_all(jobs, backend, cache, max_in_flight, retries, backoff):
+    cache_hits = [False] * len(jobs)
+    pending = []
+    for i, (text, filename) in enumerate(jobs):
+        cache_key = DiskCache.make_key(text, *backend.cache_identity())
+        if cache is not None and cache.get(cache_key, filename):
+            cache_hits[i] = True
+        else:
+            pending.append((text, filename, cache_key))
+
+    semaphore = asyncio.Semaphore(max_in_flight)
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        await asyncio.gather(*(
+            _synthesize_job(backend, executor, semaphore, text, filename, retries, backoff)
+            for text, filename, _cache_key in pending
+        ))
+
+    if cache is not None:
+        for _text, filename, cache_key in pending:
+            cache.put(cache_key, filename)
+    return cache_hits
+
+
+def synthesize_many(jobs, backend, cache=None, max_in_flight=8, retries=3, backoff=0.5):
+    """
+    Synthesize (text, filename) jobs concurrently with at most max_in_flight requests outstanding.
+    Failed requests are retried with exponential backoff. Returns a cache-hit flag per job.
+    """
+    if not jobs:
+        return []
+    return asyncio.run(_synthesize_all(jobs, backend, cache, max_in_flight, retries, backoff))
+
+
+TTS_BACKENDS = {
+    "azure": AzureTTSBackend,
+    "silence": SilenceTTSBackend,
+    "espeak": EspeakTTSBackend,
+}
+
+
+def create_backend(name, **kwargs):
+    """Instantiate a backend from TTS_BACKENDS by name."""
+    try:
+        backend_class = TTS_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown TTS backend '{name}'. Choose from: {', '.join(TTS_BACKENDS)}")
+    return backend_class(**kwargs)